@@ -4,6 +4,8 @@ import tsp_reader
 import sys
 from typing import Optional, Dict, Tuple, List
 import tsp_math
+import tsp_search
+import tsp_tour
 import tsp_plot
 import mst
 
@@ -11,43 +13,59 @@ Edge = Tuple[int, int]
 Tour = List[int]
 Coordinates = Tuple[float, float]
 Instance = Dict[int, Coordinates]
+Neighbors = Dict[int, List[int]]
 
-def improve(instance: Instance, tour: Tour) -> Optional[Tour]:
-    """If improvement found, new tour is returned. otherwise, None is returned."""
-    n = len(tour)
+def improve(instance: Instance, tour: tsp_tour.TrackedTour) -> Optional[tsp_tour.TrackedTour]:
+    """If improvement found, it is applied to tour in place and tour is returned. otherwise, None is returned."""
+    points = tour.to_list()
+    n = len(points)
+    dist = tsp_math.distance_function(instance=instance)
     for i in range(n):
         j_end = n if i > 0 else n - 1
+        a = points[i]
+        b = points[(i + 1) % n]
+        ab = dist(a, b)
         for j in range(i + 2, j_end):
-            a = tour[i]
-            b = tour[(i + 1) % n]
-            c = tour[j]
-            d = tour[(j + 1) % n]
+            c = points[j]
+            d = points[(j + 1) % n]
             # current edges
-            ab = tsp_math.distance(instance=instance, a=a, b=b)
-            cd = tsp_math.distance(instance=instance, a=c, b=d)
+            cd = dist(c, d)
             # new edges
-            ac = tsp_math.distance(instance=instance, a=a, b=c)
-            bd = tsp_math.distance(instance=instance, a=b, b=d)
+            ac = dist(a, c)
+            bd = dist(b, d)
             if ac + bd < ab + cd:
-                return tour[:i+1] + tour[i+1:j+1][::-1] + tour[j+1:]
+                tour.reverse_path(b, c)
+                return tour
     return None
 
-def hill_climb(instance: Instance, tour: Optional[Tour] = None) -> Tour:
+def hill_climb(instance: Instance, tour: Optional[Tour] = None, neighbors: Optional[Neighbors] = None, queue: bool = False, operators: Optional[List[str]] = None) -> Tour:
+    """Runs 2-opt to a local optimum. If neighbors (see tsp_neighbors.nearest_neighbors) are given, only moves adding
+    an edge between a point and one of its nearest neighbors are tried; otherwise every move is tried.
+    With queue, an active-city queue (don't-look bits) limits the search to points whose tour edges changed
+    since they were last examined, instead of rescanning the whole tour after every improvement.
+    operators selects the move operators of tsp_search.OPERATORS ("2-opt", "or-opt", "or-3opt"), tried in order at each point.
+    Moves are applied in place on a copy of tour, or on tsp_tour.new_tour(tour) (a TwoLevelTour if very long) for a list;
+    the result has the same type as tour.
+    """
     if tour is None:
         tour = list(instance.keys())
+    is_tour = isinstance(tour, tsp_tour.TrackedTour)
+    tour = tour.copy() if is_tour else tsp_tour.new_tour(tour)
     print(f"Initial tour length: {tsp_math.tour_length(instance=instance, tour=tour)}")
-    new_tour = improve(instance=instance, tour=tour)
-    iterations = 0
-    while new_tour is not None:
-        tour = new_tour
-        new_tour = improve(instance=instance, tour=tour)
-        iterations += 1
-    print(f"Done after {iterations} improvements.")
+    if operators is not None:
+        tsp_search.local_search(instance=instance, tour=tour, neighbors=neighbors, operators=operators, queue=queue)
+    elif neighbors is not None or queue:
+        tsp_search.two_opt(instance=instance, tour=tour, neighbors=neighbors, queue=queue)
+    else:
+        iterations = 0
+        while improve(instance=instance, tour=tour) is not None:
+            iterations += 1
+        print(f"Done after {iterations} improvements.")
     print(f"Final tour length: {tsp_math.tour_length(instance=instance, tour=tour)}")
-    return tour
+    return tour if is_tour else tour.to_list()
 
 if __name__ == "__main__":
-    instance = tsp_reader.read_instance(sys.argv[1])
+    instance = tsp_reader.load_instance(sys.argv[1])
     tour = hill_climb(instance=instance)
     tsp_plot.plot_tour(instance=instance, tour=tour, show=False)
 
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+
+# Uniform grid spatial index over instance points.
+
+import heapq
+import math
+from typing import Optional, Dict, Tuple, List, Iterable, Callable
+
+Instance = Dict[int, Tuple[float, float]] # point ID to coordinates
+Edge = Tuple[int, int]
+
+POINTS_PER_CELL = 2
+TOUR_EDGE_CANDIDATES = 8 # nearest tour points whose edges are returned by nearest_tour_edges.
+
+def cell_size(instance: Instance) -> float:
+    """Side length of square cells holding about POINTS_PER_CELL points each. """
+    xs = [c[0] for c in instance.values()]
+    ys = [c[1] for c in instance.values()]
+    width = max(xs) - min(xs)
+    height = max(ys) - min(ys)
+    n = len(instance)
+    if width * height > 0:
+        return math.sqrt(width * height * POINTS_PER_CELL / n)
+    return max(width, height, 1.0) * POINTS_PER_CELL / n
+
+def _ring(cx: int, cy: int, r: int) -> List[Tuple[int, int]]:
+    """Grid cells at Chebyshev distance r from cell (cx, cy). """
+    if r == 0:
+        return [(cx, cy)]
+    cells = []
+    for i in range(-r, r + 1):
+        cells.append((cx + i, cy - r))
+        cells.append((cx + i, cy + r))
+    for j in range(-r + 1, r):
+        cells.append((cx - r, cy + j))
+        cells.append((cx + r, cy + j))
+    return cells
+
+class SpatialIndex:
+    """Points of an instance bucketed into a uniform grid of square cells (cell -> point IDs).
+    Built once per instance in O(n); points can be inserted and removed as the instance or tour changes.
+    Queries only visit cells near the query point, instead of scanning every point.
+    """
+
+    def __init__(self, instance: Instance, point_ids: Optional[Iterable[int]] = None, size: Optional[float] = None):
+        """Indexes point_ids (default: every point of instance). Coordinates are read from instance. """
+        self.instance = instance
+        self.size = size if size is not None else cell_size(instance)
+        self.grid = {}
+        self.count = 0
+        self.bounds = None # min cx, min cy, max cx, max cy of cells that have held points.
+        for p in (instance if point_ids is None else point_ids):
+            self.insert(p)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _cell(self, x: float, y: float) -> Tuple[int, int]:
+        return (int(x // self.size), int(y // self.size))
+
+    def insert(self, point_id: int):
+        cx, cy = self._cell(*self.instance[point_id])
+        self.grid.setdefault((cx, cy), []).append(point_id)
+        self.count += 1
+        if self.bounds is None:
+            self.bounds = (cx, cy, cx, cy)
+        else:
+            x0, y0, x1, y1 = self.bounds
+            self.bounds = (min(x0, cx), min(y0, cy), max(x1, cx), max(y1, cy))
+
+    def remove(self, point_id: int):
+        cell = self._cell(*self.instance[point_id])
+        self.grid[cell].remove(point_id)
+        if not self.grid[cell]:
+            del self.grid[cell]
+        self.count -= 1
+
+    def nearest(self, x: float, y: float, k: int, exclude: Optional[int] = None,
+            accept: Optional[Callable[[int], bool]] = None) -> List[int]:
+        """Returns the k indexed points nearest to (x, y), nearest first (ties broken by point ID).
+        exclude is skipped, and if accept is given, only points for which it returns True are considered.
+        Rings of cells are searched outward until no unsearched cell can hold a nearer point.
+        """
+        if self.bounds is None or k <= 0:
+            return []
+        size = self.size
+        cx, cy = self._cell(x, y)
+        x0, y0, x1, y1 = self.bounds
+        max_ring = max(cx - x0, x1 - cx, cy - y0, y1 - cy) # every occupied cell is within this many rings.
+        instance = self.instance
+        heap = [] # max-heap of the k nearest so far, as (-squared distance, -point ID).
+        r = 0
+        while r <= max_ring:
+            for cell in _ring(cx, cy, r):
+                for q in self.grid.get(cell, ()):
+                    if q == exclude or (accept is not None and not accept(q)):
+                        continue
+                    qx, qy = instance[q]
+                    key = (-((qx - x) ** 2 + (qy - y) ** 2), -q)
+                    if len(heap) < k:
+                        heapq.heappush(heap, key)
+                    elif key > heap[0]:
+                        heapq.heapreplace(heap, key)
+            # points in rings beyond r are at least r cells away.
+            if len(heap) == k and -heap[0][0] <= (r * size) ** 2:
+                break
+            r += 1
+        return [-q for _, q in sorted(heap, reverse=True)]
+
+    def k_nearest(self, point_id: int, k: int) -> List[int]:
+        """Returns the k indexed points nearest to point_id, excluding itself, nearest first. """
+        x, y = self.instance[point_id]
+        return self.nearest(x, y, k, exclude=point_id)
+
+    def within(self, x: float, y: float, radius: float) -> List[int]:
+        """Returns the indexed points within Euclidean distance radius of (x, y), by point ID. """
+        if self.bounds is None:
+            return []
+        bx0, by0, bx1, by1 = self.bounds
+        x0, y0 = self._cell(x - radius, y - radius)
+        x1, y1 = self._cell(x + radius, y + radius)
+        instance = self.instance
+        r2 = radius * radius
+        points = []
+        for cx in range(max(x0, bx0), min(x1, bx1) + 1):
+            for cy in range(max(y0, by0), min(y1, by1) + 1):
+                for q in self.grid.get((cx, cy), ()):
+                    qx, qy = instance[q]
+                    if (qx - x) ** 2 + (qy - y) ** 2 <= r2:
+                        points.append(q)
+        points.sort()
+        return points
+
+    def nearest_tour_edges(self, x: float, y: float, tour, k: int = TOUR_EDGE_CANDIDATES) -> List[Edge]:
+        """Returns the tour edges (a, b), b following a, incident to the k tour points nearest to (x, y).
+        tour is a tsp_tour.ArrayTour; indexed points not in it are skipped.
+        """
+        edges = []
+        seen = set()
+        for c in self.nearest(x, y, k, accept=tour.__contains__):
+            for edge in ((tour.prev(c), c), (c, tour.next(c))):
+                if edge not in seen:
+                    seen.add(edge)
+                    edges.append(edge)
+        return edges
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+
+# Disjoint sets (union-find) over point IDs.
+
+class UnionFind:
+    """Disjoint sets of integer IDs, stored as parent and rank arrays indexed by ID.
+    find uses path compression and union uses union by rank, so any sequence of operations runs in near-linear time.
+    Every ID starts in its own set; the arrays grow as larger IDs are used.
+    """
+
+    def __init__(self, size: int = 0):
+        self.parent = list(range(size))
+        self.rank = [0] * size
+
+    def _grow(self, i: int):
+        if i >= len(self.parent):
+            self.parent.extend(range(len(self.parent), i + 1))
+            self.rank.extend([0] * (i + 1 - len(self.rank)))
+
+    def find(self, i: int) -> int:
+        """Returns the representative ID of the set containing i. """
+        if i >= len(self.parent):
+            self._grow(i)
+            return i
+        parent = self.parent
+        root = i
+        while parent[root] != root:
+            root = parent[root]
+        while parent[i] != root:
+            parent[i], i = root, parent[i]
+        return root
+
+    def union(self, a: int, b: int) -> bool:
+        """Merges the sets of a and b. Returns False if they were already the same set. """
+        a = self.find(a)
+        b = self.find(b)
+        if a == b:
+            return False
+        rank = self.rank
+        if rank[a] < rank[b]:
+            a, b = b, a
+        self.parent[b] = a
+        if rank[a] == rank[b]:
+            rank[a] += 1
+        return True
+
+    def connected(self, a: int, b: int) -> bool:
+        return self.find(a) == self.find(b)
@@ -5,75 +5,104 @@ import twoopt
 import sys
 from typing import Optional, Dict, Tuple, List
 import tsp_math
-import tsp_plot
-import mst
+import tsp_cache
+import tsp_neighbors
+import tsp_lk
+from tsp_pool import ElitePool
+from tsp_tour import ArrayTour
+import os
 import random
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 
 Edge = Tuple[int, int]
 Tour = List[int]
 Coordinates = Tuple[float, float]
 Instance = Dict[int, Coordinates]
+Neighbors = Dict[int, List[int]]
+
+NEIGHBORS = 10 # candidate neighbors per point for local search.
+OPERATORS = ["2-opt", "or-opt", tsp_lk.OPERATOR] # local search operators (see tsp_search.OPERATORS), with neighbors.
+PROCESSES = None # worker processes generating locally optimal tours (None: one per CPU).
+PENDING_PER_PROCESS = 2 # tours being generated per worker process, bounding memory and the staleness of bests.
 
 def make_randomized_tour(instance: Instance) -> Tour:
     tour = list(instance.keys())
     random.shuffle(tour)
     return tour
 
-def remove_dupes(instance: Instance, tours: List[Tour]):
-    return_tours = []
-    for i in range(len(tours)):
-        duped = False
-        for j in range(i + 1, len(tours)):
-            if tsp_math.is_dupe(instance=instance, tour=tours[i], other_tour=tours[j]):
-                duped = True
-                break
-        if not duped:
-            return_tours.append(tours[i])
-    return return_tours
-
-def is_dupe(instance: Instance, tours: List[Tour], tour: Tour):
-    for other in tours:
-        if tsp_math.is_dupe(instance=instance, tour=tour, other_tour=other):
-            return True
-    return False
-
-def clique_combine(instance: Instance, bests: List[Tour], n: int):
-    n_bests = len(bests)
-    for i in range(n_bests):
-        for j in range(i + 1, n_bests):
-            maybe_new_tour = tsp_math.integrate_tour(instance=instance, best_tour=bests[i], new_tour=bests[j])
-            if maybe_new_tour and not is_dupe(instance=instance, tours=bests, tour=maybe_new_tour):
-                bests.append(maybe_new_tour)
-    bests = sorted(bests, key = lambda x: tsp_math.tour_length(instance=instance, tour=x))[:n]
-    bests = remove_dupes(instance=instance, tours=bests)
+def clique_combine(instance: Instance, bests: ElitePool) -> ElitePool:
+    """Integrates every pair of tours in bests, adding the improved tours to bests. """
+    records = list(bests)
+    for i in range(len(records)):
+        for j in range(i + 1, len(records)):
+            maybe_new_tour = tsp_math.integrate_tour(instance=instance, best_tour=records[i].tour, new_tour=records[j].tour,
+                best_length=records[i].length)
+            if maybe_new_tour:
+                bests.add_tour(instance=instance, tour=maybe_new_tour)
     print(f"clique_combine bests length: {len(bests)}")
-    best_cost = tsp_math.tour_length(instance=instance, tour=bests[0])
-    print(f"clique_combine best cost: {best_cost}")
+    print(f"clique_combine best cost: {bests.best().length}")
     return bests
 
-def try_new_tour(instance: Instance, bests: List[Tour], n: int):
-    new_tour = twoopt.hill_climb(instance=instance, tour=make_randomized_tour(instance=instance))
-    for best in bests:
-        maybe_new_tour = tsp_math.integrate_tour(instance=instance, best_tour=best, new_tour=new_tour)
-        if maybe_new_tour and not is_dupe(instance=instance, tours=bests, tour=maybe_new_tour):
-            bests.append(maybe_new_tour)
-    bests.append(new_tour)
-    bests = sorted(bests, key = lambda x: tsp_math.tour_length(instance=instance, tour=x))
-    bests = remove_dupes(instance=instance, tours=bests)
+def climb_random_tour(instance: Instance, neighbors: Optional[Neighbors] = None) -> Tour:
+    """Returns a local optimum started from a random tour: of OPERATORS with neighbors, or else of 2-opt. """
+    operators = OPERATORS if neighbors is not None else None
+    return twoopt.hill_climb(instance=instance, tour=make_randomized_tour(instance=instance), neighbors=neighbors,
+        queue=neighbors is not None, operators=operators)
+
+def merge_new_tour(instance: Instance, bests: ElitePool, new_tour: Tour) -> ElitePool:
+    """Integrates new_tour with each of bests, then recombines bests. """
+    # pool tours are ArrayTours, so lengths are tracked through integrated k-moves instead of measured again.
+    new_tour = ArrayTour(new_tour)
+    for best in list(bests):
+        maybe_new_tour = tsp_math.integrate_tour(instance=instance, best_tour=best.tour, new_tour=new_tour, best_length=best.length)
+        if maybe_new_tour:
+            bests.add_tour(instance=instance, tour=maybe_new_tour)
+    bests.add_tour(instance=instance, tour=new_tour)
     print(f"try_new_tour bests length: {len(bests)}")
-    best_cost = tsp_math.tour_length(instance=instance, tour=bests[0])
-    print(f"try_new_tour best cost: {best_cost}")
-    return clique_combine(instance=instance, bests=bests, n=n)
+    print(f"try_new_tour best cost: {bests.best().length}")
+    return clique_combine(instance=instance, bests=bests)
+
+def try_new_tour(instance: Instance, bests: ElitePool, neighbors: Optional[Neighbors] = None) -> ElitePool:
+    new_tour = climb_random_tour(instance=instance, neighbors=neighbors)
+    return merge_new_tour(instance=instance, bests=bests, new_tour=new_tour)
+
+_worker = {} # per worker process: instance and neighbors, sent once when the worker starts.
 
-def climb(instance: Instance, n: int):
-    """Perform tour-differencing optimization, keeping the n best tours to compare among. """
-    bests = []
-    while True:
-        bests = try_new_tour(instance=instance, bests=bests, n=n)
+def _initialize(instance: Instance, neighbors: Optional[Neighbors]):
+    _worker["instance"] = instance
+    _worker["neighbors"] = neighbors
+
+def _climb_random_tour(seed: int) -> Tour:
+    # forked workers inherit the same random state, so each tour gets its own seed.
+    random.seed(seed)
+    return climb_random_tour(instance=_worker["instance"], neighbors=_worker["neighbors"])
+
+def climb(instance: Instance, n: int, neighbors: Optional[Neighbors] = None, processes: Optional[int] = PROCESSES):
+    """Perform tour-differencing optimization, keeping the n best tours to compare among.
+    If neighbors are given, new tours are found with neighbor-list local search (OPERATORS, including Lin-Kernighan).
+    New tours are generated concurrently by a pool of processes (unless processes is 1), and merged into bests
+    in this process as they finish.
+    """
+    bests = ElitePool(capacity=n)
+    if processes == 1:
+        while True:
+            bests = try_new_tour(instance=instance, bests=bests, neighbors=neighbors)
+    processes = processes or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=processes, initializer=_initialize, initargs=(instance, neighbors)) as pool:
+        pending = set()
+        while True:
+            while len(pending) < PENDING_PER_PROCESS * processes:
+                pending.add(pool.submit(_climb_random_tour, random.getrandbits(64)))
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                bests = merge_new_tour(instance=instance, bests=bests, new_tour=future.result())
 
 if __name__ == "__main__":
-    instance = tsp_reader.read_instance(sys.argv[1])
-    climb(instance=instance, n = 50)
+    instance = tsp_reader.load_instance(sys.argv[1])
+    neighbors = tsp_cache.load_or_compute(sys.argv[1], "neighbors",
+        lambda: tsp_neighbors.nearest_neighbors(instance=instance, k=NEIGHBORS), k=NEIGHBORS,
+        method=tsp_neighbors.METHOD)
+    climb(instance=instance, n = 50, neighbors=neighbors)
 
     # Visualization
     """
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+
+# Lin-Kernighan variable-depth search over candidate neighbor lists.
+
+from collections import deque
+from typing import Optional, Dict, Tuple, List
+import tsp_math
+import tsp_neighbors
+import tsp_search
+from tsp_tour import ArrayTour, TrackedTour, new_tour
+
+Instance = Dict[int, Tuple[float, float]] # point ID to coordinates
+Tour = List[int]
+Edge = Tuple[int, int]
+KMove = List[List[Edge]] # [[deleted edges], [added edges]], as in tsp_math.
+Neighbors = Dict[int, List[int]] # point ID to nearest other point IDs, nearest first
+
+NEIGHBORS = 8 # candidate list size if no neighbors are given.
+MAX_DEPTH = 50 # maximum number of exchanges (k) in one move.
+BREADTH = 5 # alternatives for the first added edge; deeper levels only try the best one.
+OPERATOR = "lin-kernighan" # name of the tsp_search.OPERATORS entry added by importing tsp_lk.
+
+def lin_kernighan(instance: Instance, tour: Tour, neighbors: Optional[Neighbors] = None,
+        max_depth: int = MAX_DEPTH, breadth: int = BREADTH) -> Tuple[Tour, List[KMove]]:
+    """Lin-Kernighan local search. Each move starts by deleting a tour edge (t1, t2), then repeatedly adds an edge
+    (t2i, t2i+1) from the candidates of t2i and deletes the edge (t2i+1, t2i+2) that makes closing (t2i+2, t1) a tour,
+    as long as the partial gain stays positive and at most max_depth edges are exchanged.
+    The longest-gaining prefix of the chain is kept. Deleted edges are never added back and added edges are never deleted.
+    Points whose tour edges changed are queued for another search (don't-look bits).
+    Moves are applied to a copy of tour, or to a tsp_tour.new_tour of a list (a TwoLevelTour if very long).
+    Returns the improved tour (same type as tour) and the applied moves, in order, as [[deleted], [added]] k-moves.
+    """
+    is_tour = isinstance(tour, TrackedTour)
+    tour = tour.copy() if is_tour else new_tour(tour)
+    if neighbors is None:
+        neighbors = tsp_neighbors.nearest_neighbors(instance=instance, k=NEIGHBORS)
+    kmoves = []
+    if len(tour) >= 5:
+        dist = tsp_math.distance_function(instance=instance)
+        active = deque(tour)
+        queued = set(tour)
+        while active:
+            t1 = active.popleft()
+            queued.discard(t1)
+            kmove = _improve_point(dist, tour, neighbors, t1, max_depth, breadth)
+            if kmove is None:
+                continue
+            kmoves.append(kmove)
+            for edge in kmove[0]:
+                for p in edge:
+                    if p not in queued:
+                        queued.add(p)
+                        active.append(p)
+    print(f"Lin-Kernighan done after {len(kmoves)} improvements.")
+    return (tour if is_tour else tour.to_list()), kmoves
+
+def _edge(a: int, b: int) -> Edge:
+    return (min(a, b), max(a, b))
+
+def _candidates(dist, tour: ArrayTour, neighbors: Neighbors, t1: int, last: int, gain: int,
+        deleted: set, added: set) -> List[Tuple[int, int, int]]:
+    """Returns (gain after deleting (t3, t4), t3, t4) of every allowed next exchange, best first. """
+    forward = tour.next(t1) == last
+    candidates = []
+    for t3 in neighbors[last]:
+        if t3 not in tour:
+            continue
+        g1 = gain - dist(last, t3)
+        if g1 <= 0:
+            break # neighbors are sorted by distance.
+        if t3 == t1 or t3 == last or _edge(last, t3) in deleted:
+            continue
+        # deleting (t3, t4) and closing (t4, t1) only gives a tour for the t4 on the t2 side of t3.
+        t4 = tour.prev(t3) if forward else tour.next(t3)
+        if t4 == last or _edge(t3, t4) in added or _edge(t4, t1) in deleted:
+            continue
+        candidates.append((g1 + dist(t3, t4), t3, t4))
+    candidates.sort(reverse=True)
+    return candidates
+
+def _improve_point(dist, tour: ArrayTour, neighbors: Neighbors, t1: int, max_depth: int, breadth: int) -> Optional[KMove]:
+    """Applies the first improving Lin-Kernighan move starting at t1. Returns it, or None if none was found. """
+    for t2 in (tour.next(t1), tour.prev(t1)):
+        gain = dist(t1, t2)
+        deleted = {_edge(t1, t2)}
+        for _, t3, t4 in _candidates(dist, tour, neighbors, t1, t2, gain, deleted, set())[:breadth]:
+            kmove = _deepen(dist, tour, neighbors, t1, t2, t3, t4, gain, max_depth)
+            if kmove is not None:
+                return kmove
+    return None
+
+def _deepen(dist, tour: ArrayTour, neighbors: Neighbors, t1: int, t2: int, t3: int, t4: int,
+        gain: int, max_depth: int) -> Optional[KMove]:
+    """Extends the chain t1 t2 t3 t4 greedily. Keeps the best closed tour if it is shorter, otherwise restores tour. """
+    deleted = [_edge(t1, t2)]
+    added = []
+    flips = []
+    best_gain = 0
+    best_depth = 0
+    last = t2
+    while True:
+        # t1 last ... t4 t3  ->  t1 t4 ... last t3
+        tsp_search.two_opt_move(tour, t1, last, t4, t3)
+        flips.append((t1, last, t4, t3))
+        gain += dist(t3, t4) - dist(last, t3)
+        added.append(_edge(last, t3))
+        deleted.append(_edge(t3, t4))
+        last = t4
+        closed_gain = gain - dist(last, t1)
+        if closed_gain > best_gain:
+            best_gain = closed_gain
+            best_depth = len(flips)
+        if len(flips) + 1 >= max_depth:
+            break
+        candidates = _candidates(dist, tour, neighbors, t1, last, gain, set(deleted), set(added))
+        if not candidates:
+            break
+        _, t3, t4 = candidates[0]
+    # undo the flips past the best closed tour.
+    while len(flips) > best_depth:
+        a, b, c, d = flips.pop()
+        tsp_search.two_opt_move(tour, a, c, b, d)
+    if best_depth == 0:
+        return None
+    return [deleted[:best_depth + 1], added[:best_depth] + [_edge(flips[-1][2], t1)]]
+
+def _lk_point(dist, tour: ArrayTour, neighbors: Optional[Neighbors], t1: int) -> Tuple[int, ...]:
+    """tsp_search operator: applies the first improving Lin-Kernighan move starting at t1 (see lin_kernighan).
+    Returns the endpoints of its deleted edges, or an empty tuple if no improving move was found.
+    """
+    assert(neighbors is not None)
+    kmove = _improve_point(dist, tour, neighbors, t1, MAX_DEPTH, BREADTH)
+    if kmove is None:
+        return ()
+    return tuple(p for edge in kmove[0] for p in edge)
+
+tsp_search.OPERATORS[OPERATOR] = _lk_point
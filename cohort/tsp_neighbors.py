@@ -0,0 +1,23 @@
+#!/usr/bin/env python3
+
+# k-nearest neighbor candidate lists, found with a uniform grid.
+
+from typing import Optional, Dict, Tuple, List, Iterable
+import tsp_spatial
+
+Instance = Dict[int, Tuple[float, float]] # point ID to coordinates
+Neighbors = Dict[int, List[int]] # point ID to nearest other point IDs, nearest first
+
+METHOD = "grid" # how nearest_neighbors finds the neighbors, for cache keys (see tsp_cache).
+
+def nearest_neighbors(instance: Instance, k: int, spatial_index: Optional[tsp_spatial.SpatialIndex] = None,
+        point_ids: Optional[Iterable[int]] = None) -> Neighbors:
+    """Returns the k nearest other indexed points of every point of point_ids (default: every point), nearest first
+    (ties broken by point ID).
+    Points are bucketed into a grid (spatial_index, built here over every point if not given), and each query searches
+    rings of cells outward until no unsearched cell can hold a nearer point.
+    """
+    if spatial_index is None:
+        spatial_index = tsp_spatial.SpatialIndex(instance=instance)
+    k = min(k, len(spatial_index) - 1)
+    return {p: spatial_index.k_nearest(point_id=p, k=k) for p in (instance if point_ids is None else point_ids)}
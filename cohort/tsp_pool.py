@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+
+# Tours with cached length and edge set, for fast duplicate detection, and a bounded pool of the best tours found.
+
+import bisect
+from typing import Optional, Dict, Tuple, List, FrozenSet, Iterable, Iterator
+import tsp_math
+
+Edge = Tuple[int, int]
+Tour = List[int]
+Instance = Dict[int, Tuple[float, float]]
+
+DUPE_EDGES = 20 # tours of equal length differing in at most this many edges are duplicates.
+
+def edge_set(tour: Tour) -> FrozenSet[Edge]:
+    """Edges of tour as (smaller, larger) point ID pairs: the same for any rotation or direction of the tour. """
+    points = list(tour)
+    return frozenset([(a, b) if a < b else (b, a) for a, b in zip(points, points[1:] + points[:1])])
+
+class TourRecord:
+    """A tour with its length, edge set and fingerprint (hash of the edge set), computed once. """
+
+    __slots__ = ("tour", "length", "edges", "fingerprint")
+
+    def __init__(self, instance: Instance, tour: Tour, length: Optional[int] = None):
+        self.tour = tour
+        self.length = length if length is not None else tsp_math.tour_length(instance=instance, tour=tour)
+        self.edges = edge_set(tour)
+        self.fingerprint = hash(self.edges)
+
+    def is_dupe(self, other: "TourRecord") -> bool:
+        """Same as tsp_math.is_dupe(tour, other_tour) (same length, at most DUPE_EDGES edges differ). """
+        if self.length != other.length:
+            return False
+        if self.fingerprint == other.fingerprint and self.edges == other.edges:
+            return True
+        return len(self.edges - other.edges) <= DUPE_EDGES
+
+class DupeIndex:
+    """Tour records by length and fingerprint. An exact duplicate is found with a dict lookup,
+    and the near-duplicate test only runs against records of the same length.
+    """
+
+    def __init__(self, records: Iterable[TourRecord] = ()):
+        self.exact = {} # (length, fingerprint) -> records.
+        self.buckets = {} # length -> records.
+        for record in records:
+            self.add(record)
+
+    def add(self, record: TourRecord):
+        self.exact.setdefault((record.length, record.fingerprint), []).append(record)
+        self.buckets.setdefault(record.length, []).append(record)
+
+    def remove(self, record: TourRecord):
+        key = (record.length, record.fingerprint)
+        self.exact[key].remove(record)
+        if not self.exact[key]:
+            del self.exact[key]
+        self.buckets[record.length].remove(record)
+        if not self.buckets[record.length]:
+            del self.buckets[record.length]
+
+    def find_dupe(self, record: TourRecord) -> Optional[TourRecord]:
+        """Returns an indexed duplicate of record, or None. """
+        for other in self.exact.get((record.length, record.fingerprint), ()):
+            if other.edges == record.edges:
+                return other
+        for other in self.buckets.get(record.length, ()):
+            if record.is_dupe(other):
+                return other
+        return None
+
+    def __contains__(self, record: TourRecord) -> bool:
+        return self.find_dupe(record) is not None
+
+class ElitePool:
+    """The (at most) capacity shortest distinct tours seen, as TourRecords sorted by length.
+    Adding a tour when the pool is full evicts the longest one.
+    """
+
+    def __init__(self, capacity: int):
+        assert(capacity > 0)
+        self.capacity = capacity
+        self.records = []
+        self.lengths = [] # lengths of records, for bisection.
+        self.index = DupeIndex()
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __iter__(self) -> Iterator[TourRecord]:
+        return iter(self.records)
+
+    def __getitem__(self, i: int) -> TourRecord:
+        return self.records[i]
+
+    def best(self) -> TourRecord:
+        return self.records[0]
+
+    def worst(self) -> TourRecord:
+        return self.records[-1]
+
+    def add(self, record: TourRecord) -> bool:
+        """Adds record, unless it duplicates a member or the pool is full of tours no longer than it.
+        Returns True if record was added.
+        """
+        if len(self.records) == self.capacity and record.length >= self.lengths[-1]:
+            return False
+        if record in self.index:
+            return False
+        i = bisect.bisect_right(self.lengths, record.length)
+        self.records.insert(i, record)
+        self.lengths.insert(i, record.length)
+        self.index.add(record)
+        if len(self.records) > self.capacity:
+            self.index.remove(self.records.pop())
+            self.lengths.pop()
+        return True
+
+    def add_tour(self, instance: Instance, tour: Tour, length: Optional[int] = None) -> bool:
+        """Same as add, but skips building the edge set of tours too long for a full pool. """
+        if length is None:
+            length = tsp_math.tour_length(instance=instance, tour=tour)
+        if len(self.records) == self.capacity and length >= self.lengths[-1]:
+            return False
+        return self.add(TourRecord(instance=instance, tour=tour, length=length))
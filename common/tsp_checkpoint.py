@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+
+# Throttled tour checkpoints.
+
+import time
+from typing import Optional, List
+import tsp_io
+
+Tour = List[int]
+
+INTERVAL = 10.0 # minimum seconds between writes of one checkpoint.
+
+class Checkpointer:
+    """Keeps the tour file at path up to date without rewriting it on every iteration.
+    update() can be called every iteration: a tour is written (atomically, see tsp_io.write_tour) only if at least
+    interval seconds passed since the last write, and otherwise is kept as pending until the first update() (of any
+    tour) after the interval, or flush().
+    With improvements_only, tours no shorter than the best tour seen so far are ignored.
+    """
+
+    def __init__(self, path: str, interval: float = INTERVAL, binary: bool = False, improvements_only: bool = True):
+        self.path = path
+        self.interval = interval
+        self.binary = binary
+        self.improvements_only = improvements_only
+        self.best_length = None
+        self.pending = None # tour not yet written.
+        self.last_write = None
+
+    def update(self, tour: Tour, length: Optional[int] = None):
+        """Records tour (of the given length, needed with improvements_only). """
+        now = time.monotonic()
+        due = self.last_write is None or now - self.last_write >= self.interval
+        if self.improvements_only:
+            assert(length is not None)
+            if self.best_length is not None and length >= self.best_length:
+                if due:
+                    self.flush()
+                return
+            self.best_length = length
+        if due:
+            self._write(tour)
+        else:
+            self.pending = list(tour)
+
+    def flush(self):
+        """Writes the pending tour, if any. """
+        if self.pending is not None:
+            self._write(self.pending)
+
+    def _write(self, tour: Tour):
+        tsp_io.write_tour(tour=tour, path=self.path, binary=self.binary)
+        self.pending = None
+        self.last_write = time.monotonic()
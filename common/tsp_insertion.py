@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+
+# Cheapest insertion of points into a tour, searching only near the inserted point.
+
+from typing import Optional, Dict, Tuple, List, Iterable
+import tsp_math
+from tsp_spatial import SpatialIndex, TOUR_EDGE_CANDIDATES
+from tsp_tour import ArrayTour
+
+Instance = Dict[int, Tuple[float, float]] # point ID to coordinates
+
+class TourInserter:
+    """Inserts points into a tour at the cheapest of the tour edges incident to the k tour points nearest to them,
+    instead of scanning every tour edge (tsp_math.min_cost_insertion). Finding the edge costs O(k) distances
+    plus a grid search; insert then shifts the tour positions (O(n) per point), while insert_all links a batch
+    of points in O(1) each and rebuilds the tour once.
+    Keeps a spatial index of the points in the tour: the tours passed in must hold exactly the indexed points
+    (a copy of the tour, e.g. as returned by 2-opt hill_climb, is fine), and points must be inserted and removed
+    through the inserter.
+    """
+
+    def __init__(self, instance: Instance, point_ids: Iterable[int] = (), k: int = TOUR_EDGE_CANDIDATES):
+        """point_ids are the points already in the tour. """
+        self.instance = instance
+        self.k = k
+        self.dist = tsp_math.distance_function(instance=instance)
+        # sized for the whole instance, the density the tour grows to.
+        self.index = SpatialIndex(instance=instance, point_ids=point_ids)
+
+    def _cheapest_edge(self, point_id: int, prev_point, next_point) -> Tuple[int, Optional[int], Optional[int]]:
+        """Returns the least added length of inserting point_id into a candidate tour edge (a, b), and a and b
+        (None if the tour is empty). prev_point and next_point give the tour neighbors of a tour point.
+        """
+        dist = self.dist
+        x, y = self.instance[point_id]
+        best = (0, None, None)
+        for c in self.index.nearest(x, y, self.k):
+            for a, b in ((prev_point(c), c), (c, next_point(c))):
+                cost = dist(a, point_id) + dist(point_id, b) - dist(a, b)
+                if best[2] is None or cost < best[0]:
+                    best = (cost, a, b)
+        return best
+
+    def insert(self, tour: ArrayTour, point_id: int) -> int:
+        """Inserts point_id into tour in place at its cheapest candidate edge. Returns the added length. """
+        # the instance may have grown (e.g. midpoints added) since the distance function was bound.
+        self.dist = tsp_math.distance_function(instance=self.instance)
+        cost, _, b = self._cheapest_edge(point_id, tour.prev, tour.next)
+        tour.insert(len(tour) if b is None else tour.positions[b], point_id)
+        self.index.insert(point_id)
+        return cost
+
+    def insert_all(self, tour: ArrayTour, point_ids: Iterable[int]) -> int:
+        """Inserts point_ids into tour in place, one after another, each at its cheapest candidate edge
+        (earlier insertions create edges for later ones). Returns the added length.
+        The points are linked into successor and predecessor maps, and tour is rebuilt once at the end,
+        so each insertion is O(1) instead of shifting the tour.
+        """
+        self.dist = tsp_math.distance_function(instance=self.instance)
+        points = tour.points
+        successors = {a: b for a, b in zip(points, points[1:] + points[:1])}
+        predecessors = {b: a for a, b in successors.items()}
+        total = 0
+        for p in point_ids:
+            cost, a, b = self._cheapest_edge(p, predecessors.__getitem__, successors.__getitem__)
+            if b is None:
+                a = b = p
+            successors[a] = p
+            predecessors[p] = a
+            successors[p] = b
+            predecessors[b] = p
+            self.index.insert(p)
+            total += cost
+        if successors:
+            first = points[0] if points else next(iter(successors))
+            new_points = [first]
+            p = successors[first]
+            while p != first:
+                new_points.append(p)
+                p = successors[p]
+            tour.set_points(new_points, delta=total)
+        return total
+
+    def remove(self, tour: ArrayTour, point_id: int):
+        tour.remove(point_id)
+        self.index.remove(point_id)
+
+    def remove_all(self, tour: ArrayTour, point_ids: Iterable[int]) -> List[int]:
+        """Removes point_ids from tour in one pass. Returns the points that gained a new edge (see ArrayTour.remove_all). """
+        point_ids = list(point_ids)
+        ends = tour.remove_all(point_ids)
+        for p in point_ids:
+            self.index.remove(p)
+        return ends
+
+def insert_points(instance: Instance, tour: ArrayTour, point_ids: Iterable[int], k: int = TOUR_EDGE_CANDIDATES) -> ArrayTour:
+    """Inserts point_ids into tour in place (see TourInserter.insert_all) and returns it. """
+    TourInserter(instance=instance, point_ids=tour, k=k).insert_all(tour, point_ids)
+    return tour
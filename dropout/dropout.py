@@ -3,39 +3,45 @@
 import tsp_io
 import two_opt
 import sys
-from typing import List
-from tsp_types import Edge, Tour, Tuple, Instance
+from typing import Optional, Dict, List
+from tsp_types import Instance
 import tsp_math
-import random
+import tsp_cache
+import tsp_checkpoint
+import tsp_neighbors
+import tsp_lk
+import tsp_perturbation
+from tsp_pool import TourRecord
+from tsp_tour import ArrayTour
 
 THRESHOLD = 20
 MAX_INT = 100
 BEST_TOUR_PATH = "/tmp/local_optimum.tour"
 BAD_TOUR_PATH = "/tmp/bad.tour"
+NEIGHBORS = 10 # candidate neighbors per point for local search.
+OPERATORS = ["2-opt", "or-opt", tsp_lk.OPERATOR] # local search operators (see tsp_search.OPERATORS), with neighbors.
 
-def random_drop(threshold: int, max_int: int) -> bool:
-    assert(threshold < max_int)
-    return random.randint(0, max_int) < threshold
+Neighbors = Dict[int, List[int]]
 
-def drop_points(tour: Tour, threshold: int, max_int: int) -> Tuple[Tour, List[int]]:
-    new_tour = []
-    dropped = []
-    for p in tour:
-        if random_drop(threshold=threshold, max_int=max_int):
-            dropped.append(p)
-        else:
-            new_tour.append(p)
-    print(f"dropped {round(len(dropped) / len(tour) * 100)} %")
-    return new_tour, dropped
-
-def hill_climb(instance: Instance, tour: Tour) -> Tour:
-    new_tour, dropped = drop_points(tour=tour, threshold=THRESHOLD, max_int=MAX_INT)
-    new_tour = two_opt.hill_climb(instance=instance, tour=new_tour)
-    for p in dropped:
-        new_tour = tsp_math.min_cost_insertion(instance=instance, tour=new_tour, new_point_id=p)
-    new_tour = two_opt.hill_climb(instance=instance, tour=new_tour)
+def hill_climb(instance: Instance, current: TourRecord, neighbors: Optional[Neighbors] = None,
+        best: Optional[tsp_checkpoint.Checkpointer] = None, bad: Optional[tsp_checkpoint.Checkpointer] = None) -> TourRecord:
+    """One dropout iteration from the current tour. Returns the improved tour, or current if there was no improvement.
+    Improved tours are recorded to the best checkpoint, rejected ones to the bad checkpoint. current is recorded to the
+    best checkpoint on every iteration, so a best tour held back by its interval is written without waiting for another
+    improvement.
+    """
+    tour = current.tour
+    # an ArrayTour keeps its length up to date through the drop, local search, insertions and k-moves.
+    new_tour = ArrayTour(tour)
+    tsp_math.tour_length(instance=instance, tour=new_tour)
+    dropped, ends = tsp_perturbation.drop_points(tour=new_tour, threshold=THRESHOLD, max_int=MAX_INT)
+    operators = OPERATORS if neighbors is not None else None
+    # current is a local optimum, so only the neighborhoods of the changed edges need searching.
+    new_tour = two_opt.hill_climb(instance=instance, tour=new_tour, neighbors=neighbors, operators=operators, seeds=ends)
+    tsp_perturbation.reinsert_points(instance=instance, tour=new_tour, point_ids=dropped)
+    new_tour = two_opt.hill_climb(instance=instance, tour=new_tour, neighbors=neighbors, operators=operators, seeds=dropped)
     new_length = tsp_math.tour_length(instance=instance, tour=new_tour)
-    original_length = tsp_math.tour_length(instance=instance, tour=tour)
+    original_length = current.length
     print(f"dropout: {original_length} -> {new_length}")
     if original_length <= new_length:
         improved = False
@@ -48,7 +54,7 @@ def hill_climb(instance: Instance, tour: Tour) -> Tour:
         for kmove in kmoves:
             gain = tsp_math.kmove_gain(instance=instance, kmove=kmove)
             if gain > 0:
-                maybe_new_tour = tsp_math.apply_kmove(tour=tour, kmove=kmove)
+                maybe_new_tour = tsp_math.apply_kmove(tour=tour, kmove=kmove, gain=gain)
                 if maybe_new_tour is not None:
                     print(f"Improved via single kmove! k={len(kmove[0])}, gain={gain}")
                     new_tour = maybe_new_tour
@@ -66,7 +72,7 @@ def hill_climb(instance: Instance, tour: Tour) -> Tour:
                 new_gain = overall_gain - gain
                 if new_gain > 0:
                     new_kmoves = kmoves[:i] + kmoves[i+1:]
-                    maybe_new_tour = tsp_math.apply_kmoves(tour=tour, kmoves=new_kmoves)
+                    maybe_new_tour = tsp_math.apply_kmoves(tour=tour, kmoves=new_kmoves, gain=new_gain)
                     if maybe_new_tour is not None:
                         print(f"Improved via composite kmove! k={sum([len(km) for km in new_kmoves])}, gain={new_gain}")
                         new_tour = maybe_new_tour
@@ -80,20 +86,35 @@ def hill_climb(instance: Instance, tour: Tour) -> Tour:
 
     print()
     if new_length < original_length:
-        tsp_io.write_tour(tour=new_tour, path=BEST_TOUR_PATH)
-        return new_tour
+        if best is not None:
+            best.update(tour=new_tour, length=new_length)
+        return TourRecord(instance=instance, tour=new_tour, length=new_length)
     else:
-        tsp_io.write_tour(tour=new_tour, path=BAD_TOUR_PATH)
-        return tour
+        if bad is not None:
+            bad.update(tour=new_tour)
+        if best is not None:
+            # writes an improvement the interval held back, once it is due (see Checkpointer.update).
+            best.update(tour=current.tour, length=current.length)
+        return current
 
 
 if __name__ == "__main__":
     instance_file = sys.argv[1]
-    instance = tsp_io.read_instance(instance_file)
-    tour = two_opt.hill_climb(instance=instance, tour=None, randomize=True)
+    instance = tsp_io.load_instance(instance_file)
+    neighbors = tsp_cache.load_or_compute(instance_file, "neighbors",
+        lambda: tsp_neighbors.nearest_neighbors(instance=instance, k=NEIGHBORS), k=NEIGHBORS,
+        method=tsp_neighbors.METHOD)
+    tour = two_opt.hill_climb(instance=instance, tour=None, randomize=True, neighbors=neighbors, queue=True, operators=OPERATORS)
 
+    best = tsp_checkpoint.Checkpointer(path=BEST_TOUR_PATH)
+    bad = tsp_checkpoint.Checkpointer(path=BAD_TOUR_PATH, improvements_only=False)
+    current = TourRecord(instance=instance, tour=ArrayTour(tour))
     iteration = 0
-    while True:
-        tour = hill_climb(instance=instance, tour=tour)
-        iteration += 1
-        print(f"iteration: {iteration}")
+    try:
+        while True:
+            current = hill_climb(instance=instance, current=current, neighbors=neighbors, best=best, bad=bad)
+            iteration += 1
+            print(f"iteration: {iteration}")
+    finally:
+        best.flush()
+        bad.flush()
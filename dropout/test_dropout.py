@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+
+# Checks that dropout keeps the best tour file up to date. Run with: python3 -m pytest dropout
+
+import os
+import time
+
+import dropout
+import tsp_checkpoint
+import tsp_io
+import tsp_math
+from tsp_pool import TourRecord
+from tsp_tour import ArrayTour
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data")
+INSTANCE_PATH = os.path.join(DATA, "xqf131.tsp")
+OPTIMAL_TOUR_PATH = os.path.join(DATA, "xqf131.tour")
+
+def test_held_back_best_is_written(tmp_path):
+    instance = tsp_io.read_instance(INSTANCE_PATH)
+    optimal = tsp_io.read_tour(OPTIMAL_TOUR_PATH)
+    path = str(tmp_path / "best.tour")
+    best = tsp_checkpoint.Checkpointer(path=path, interval=0.5)
+    start = list(instance.keys())
+    best.update(tour=start, length=tsp_math.tour_length(instance=instance, tour=start))
+    # an improvement inside the interval is held back.
+    current = TourRecord(instance=instance, tour=ArrayTour(optimal))
+    best.update(tour=current.tour, length=current.length)
+    assert(tsp_io.read_tour(path) == start)
+    time.sleep(0.5)
+    # the optimal tour cannot be improved, so no further improvement comes.
+    assert(dropout.hill_climb(instance=instance, current=current, best=best) is current)
+    assert(tsp_io.read_tour(path) == optimal)
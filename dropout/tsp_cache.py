@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+
+# Binary sidecar cache (.tspb) of parsed instances, memory-mapped on load,
+# and a directory cache of structures precomputed from an instance (neighbor lists, MST, useless edges).
+
+import hashlib
+import json
+import mmap
+import os
+import pickle
+import struct
+import sys
+from typing import Optional, Callable, Any
+from tsp_instance import ArrayInstance
+
+MAGIC = b"TSPB"
+VERSION = 1
+SUFFIX = ".tspb"
+DIRECTORY_SUFFIX = ".cache"
+PREFIX = struct.Struct("<4sIQ") # magic, version, JSON header length.
+
+def cache_path(path: str) -> str:
+    return path + SUFFIX
+
+def _source_key(path: str) -> dict:
+    stat = os.stat(path)
+    return {"source_mtime_ns": stat.st_mtime_ns, "source_size": stat.st_size}
+
+def _padded(n: int) -> int:
+    return (n + 7) // 8 * 8
+
+def write_cache(path: str, instance: ArrayInstance):
+    """Writes instance to the sidecar of the instance file at path.
+    Layout: PREFIX, JSON metadata (source file key, TSPLIB header, array lengths) padded to 8 bytes,
+    then the native-endian ids (int64), x and y (float64) arrays.
+    The file is written under a temporary name and renamed into place, so readers never see a partial cache.
+    """
+    metadata = _source_key(path)
+    metadata["byteorder"] = sys.byteorder
+    metadata["header"] = instance.header
+    metadata["count"] = len(instance.ids)
+    metadata["size"] = len(instance.x)
+    metadata = json.dumps(metadata).encode()
+    target = cache_path(path)
+    temporary = f"{target}.{os.getpid()}.tmp"
+    try:
+        with open(temporary, "wb") as f:
+            f.write(PREFIX.pack(MAGIC, VERSION, len(metadata)))
+            f.write(metadata.ljust(_padded(len(metadata)), b" "))
+            f.write(memoryview(instance.ids).cast("B"))
+            f.write(memoryview(instance.x).cast("B"))
+            f.write(memoryview(instance.y).cast("B"))
+        os.replace(temporary, target)
+    except OSError as e:
+        print(f"Could not write instance cache {target}: {e}")
+        if os.path.exists(temporary):
+            os.remove(temporary)
+
+def read_cache(path: str) -> Optional[ArrayInstance]:
+    """Returns the cached instance for the instance file at path, or None if there is no cache,
+    or it is stale (the instance file's mtime or size changed), or it was written by another version or byte order.
+    The arrays are read-only copy-on-write memory maps of the cache file: nothing is parsed or copied up front,
+    and writes to the instance stay private to this process.
+    """
+    target = cache_path(path)
+    try:
+        with open(target, "rb") as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    except (OSError, ValueError):
+        return None
+    if len(buffer) < PREFIX.size:
+        return None
+    magic, version, metadata_length = PREFIX.unpack_from(buffer)
+    if magic != MAGIC or version != VERSION:
+        return None
+    start = PREFIX.size
+    metadata = json.loads(bytes(buffer[start:start + metadata_length]))
+    source_key = _source_key(path)
+    if any(metadata.get(key) != value for key, value in source_key.items()) or metadata.get("byteorder") != sys.byteorder:
+        return None
+    count = metadata["count"]
+    size = metadata["size"]
+    start += _padded(metadata_length)
+    if len(buffer) != start + 8 * (count + 2 * size):
+        return None
+    view = memoryview(buffer)
+    instance = ArrayInstance()
+    instance.header = metadata["header"]
+    instance.ids = view[start:start + 8 * count].cast("q")
+    start += 8 * count
+    instance.x = view[start:start + 8 * size].cast("d")
+    start += 8 * size
+    instance.y = view[start:start + 8 * size].cast("d")
+    return instance
+
+def content_hash(path: str) -> str:
+    """Returns the SHA-1 hex digest of the file at path. """
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def load_or_compute(path: str, name: str, compute: Callable[[], Any], **params) -> Any:
+    """Returns the structure called name computed from the instance file at path with the given parameters
+    (e.g. k=10, method="naive"), loading it from <path>.cache/ if it was computed before.
+    Otherwise compute() is called and its result pickled there. Entries are keyed by the instance file's content hash,
+    so an edited instance never reads an entry computed for its old contents.
+    """
+    key = "-".join([name] + [f"{k}={v}" for k, v in sorted(params.items())] + [content_hash(path)[:16]])
+    directory = path + DIRECTORY_SUFFIX
+    target = os.path.join(directory, key + ".pickle")
+    try:
+        with open(target, "rb") as f:
+            return pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        pass
+    result = compute()
+    temporary = f"{target}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(directory, exist_ok=True)
+        with open(temporary, "wb") as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary, target)
+    except OSError as e:
+        print(f"Could not write cache {target}: {e}")
+        if os.path.exists(temporary):
+            os.remove(temporary)
+    return result
@@ -1,14 +1,24 @@
 #!/usr/bin/env python3
 
-from typing import Tuple, List, Set, Optional
-from tsp_types import Instance, Tour, Edge, Dict
-import math
+from typing import Tuple, List, Set, Optional, Callable
+from tsp_types import Instance, Tour, Edge
+from tsp_instance import ArrayInstance
+from tsp_tour import ArrayTour, TrackedTour
+from tsp_spatial import SpatialIndex
+from union_find import UnionFind
+import numpy as np
+
+CHECK_LENGTHS = False # debug: recompute tracked tour lengths from scratch to catch a wrong delta.
 
 def distance(instance: Instance, a: int, b: int) -> int:
-    """instance is a dict of point IDs to x, y coordinates.
+    """instance is a dict of point IDs to x, y coordinates, or an ArrayInstance.
     a and b are the point IDs of the points we want to calculate the distance between.
     Returns distance as rounded int, as per TSPLIB standard.
     """
+    if isinstance(instance, ArrayInstance):
+        dx = instance.x[b] - instance.x[a]
+        dy = instance.y[b] - instance.y[a]
+        return int(round((dx ** 2 + dy ** 2) ** 0.5))
     ax = instance[a][0]
     ay = instance[a][1]
     bx = instance[b][0]
@@ -17,12 +27,67 @@ def distance(instance: Instance, a: int, b: int) -> int:
     dy = by - ay
     return int(round((dx ** 2 + dy ** 2) ** 0.5))
 
+def distance_function(instance: Instance) -> Callable[[int, int], int]:
+    """Returns distance(a, b) bound to instance, with the coordinate containers looked up once.
+    Same result as distance(), but cheaper per call; meant for hot loops.
+    """
+    if isinstance(instance, ArrayInstance):
+        x = instance.x
+        y = instance.y
+        def array_distance(a: int, b: int) -> int:
+            dx = x[b] - x[a]
+            dy = y[b] - y[a]
+            return int(round((dx * dx + dy * dy) ** 0.5))
+        return array_distance
+    def dict_distance(a: int, b: int) -> int:
+        ax, ay = instance[a]
+        bx, by = instance[b]
+        dx = bx - ax
+        dy = by - ay
+        return int(round((dx * dx + dy * dy) ** 0.5))
+    return dict_distance
+
+def _coordinate_arrays(instance: Instance, point_ids) -> Tuple[np.ndarray, np.ndarray]:
+    """Returns x and y coordinates for a point ID or an array of point IDs. """
+    if isinstance(instance, ArrayInstance):
+        return np.frombuffer(instance.x)[point_ids], np.frombuffer(instance.y)[point_ids]
+    if np.ndim(point_ids) == 0:
+        return instance[int(point_ids)]
+    coordinates = np.array([instance[p] for p in point_ids.tolist()], dtype=np.float64).reshape(-1, 2)
+    return coordinates[:, 0], coordinates[:, 1]
+
+def distances(instance: Instance, a, b) -> np.ndarray:
+    """Vectorized distance(). a and b are point IDs or equal-length arrays of point IDs (a single ID is broadcast).
+    Returns an int64 array of the rounded distances between a[i] and b[i], as per TSPLIB standard.
+    """
+    ax, ay = _coordinate_arrays(instance=instance, point_ids=np.asarray(a, dtype=np.int64))
+    bx, by = _coordinate_arrays(instance=instance, point_ids=np.asarray(b, dtype=np.int64))
+    dx = bx - ax
+    dy = by - ay
+    return np.rint(np.sqrt(dx * dx + dy * dy)).astype(np.int64)
+
+def _tour_array(tour: Tour) -> np.ndarray:
+    if isinstance(tour, TrackedTour):
+        return np.asarray(tour.points if isinstance(tour, ArrayTour) else tour.to_list(), dtype=np.int64)
+    return np.asarray(tour, dtype=np.int64)
+
+def _measure_length(instance: Instance, tour: Tour) -> int:
+    points = _tour_array(tour)
+    return int(distances(instance=instance, a=points, b=np.roll(points, 1)).sum())
+
 def tour_length(instance: Instance, tour: Tour) -> int:
-    total = 0
-    prev = tour[-1]
-    for point_id in tour:
-        total += distance(instance=instance, a=point_id, b=prev)
-        prev = point_id
+    """Returns the length of tour. An ArrayTour or TwoLevelTour is measured once, then its length is tracked through every change
+    (see TrackedTour.track_length). With CHECK_LENGTHS, a tracked length is checked against a full measurement.
+    """
+    if isinstance(tour, TrackedTour):
+        total = tour.tracked_length(source=instance)
+        if total is None:
+            total = _measure_length(instance=instance, tour=tour)
+            tour.track_length(source=instance, distance=distance_function(instance=instance), length=total)
+        elif CHECK_LENGTHS:
+            assert(total == _measure_length(instance=instance, tour=tour))
+    else:
+        total = _measure_length(instance=instance, tour=tour)
     return total
 
 def get_edges_from_tour(tour: Tour) -> Tuple[Edge]:
@@ -33,34 +98,37 @@ def get_edges_from_tour(tour: Tour) -> Tuple[Edge]:
         prev = point_id
     return edges
 
-def min_cost_insertion(instance: Instance, tour: Tour, new_point_id: int) -> Tour:
-    edges = get_edges_from_tour(tour=tour)
+def min_cost_insertion(instance: Instance, tour: Tour, new_point_id: int, spatial_index: Optional[SpatialIndex] = None) -> Tour:
+    """Inserts new_point_id into the tour edge where it adds the least length.
+    With spatial_index (and an ArrayTour), only the edges next to the tour points nearest to new_point_id are tried.
+    """
     p = new_point_id
-    min_cost = math.inf
-    min_replacement = None
-    for edge in edges:
-        a, b = edge
-        ab = distance(instance=instance, a=a, b=b)
-        pa = distance(instance=instance, a=p, b=a)
-        pb = distance(instance=instance, a=p, b=b)
-        diff = pa + pb - ab
-        if diff == min_cost:
-            min_replacement.append(edge)
-        elif diff < min_cost:
-            min_cost = diff
-            min_replacement = [edge]
-    old_edge = min_replacement[0] # TODO: have multiple methods for choosing among candidates.
-    a, b = old_edge
-    i = tour.index(a)
-    j = tour.index(b)
-    diff = abs(i - j)
-    if diff == 1:
-        return tour[:max(i, j)] + [p] + tour[max(i, j):]
+    if spatial_index is not None:
+        assert(isinstance(tour, ArrayTour))
+        edges = np.array(spatial_index.nearest_tour_edges(*instance[p], tour=tour), dtype=np.int64)
+        prev_points = edges[:, 0]
+        points = edges[:, 1]
     else:
-        assert(min(i, j) == 0)
+        # edge k is (tour[k - 1], tour[k]), as ordered by get_edges_from_tour.
+        points = _tour_array(tour)
+        prev_points = np.roll(points, 1)
+    pa = distances(instance=instance, a=p, b=prev_points)
+    pb = distances(instance=instance, a=p, b=points)
+    ab = distances(instance=instance, a=prev_points, b=points)
+    diff = pa + pb - ab
+    min_replacement = np.flatnonzero(diff == diff.min())
+    k = int(min_replacement[0]) # TODO: have multiple methods for choosing among candidates.
+    if spatial_index is not None:
+        k = tour.index(int(points[k]))
+    if isinstance(tour, ArrayTour):
+        # inserted in place; edge 0 closes the tour, so it is split by appending.
+        tour.insert(k if k > 0 else len(tour), p)
+        return tour
+    if k == 0:
         return tour + [p]
+    return tour[:k] + [p] + tour[k:]
 
-def add_midpoint_to_instance(instance: Instance, edge: Edge):
+def add_midpoint_to_instance(instance: Instance, edge: Edge, spatial_index: Optional[SpatialIndex] = None):
     a, b = edge
     ax = instance[a][0]
     ay = instance[a][1]
@@ -70,12 +138,14 @@ def add_midpoint_to_instance(instance: Instance, edge: Edge):
     dy = by - ay
     new_id = max(instance.keys()) + 1
     instance[new_id] = (ax + dx / 2, ay + dy / 2)
+    if spatial_index is not None:
+        spatial_index.insert(new_id)
     return new_id
 
-def add_midpoints_to_instance(instance: Instance, edges: List[Edge]):
+def add_midpoints_to_instance(instance: Instance, edges: List[Edge], spatial_index: Optional[SpatialIndex] = None):
     new_point_ids = []
     for edge in edges:
-        new_point_ids.append(add_midpoint_to_instance(instance=instance, edge=edge))
+        new_point_ids.append(add_midpoint_to_instance(instance=instance, edge=edge, spatial_index=spatial_index))
     return new_point_ids
 
 def _normalize_edge(edge: Edge) -> Edge:
@@ -103,48 +173,16 @@ def tour_difference(old_tour: Tour, new_tour: Tour) -> Tuple[List[Edge], List[Ed
     assert(len(deleted_edges) == len(added_edges))
     return deleted_edges, added_edges
 
-def _map_points_to_edges(edges: List[Edge]) -> Dict[int, Set[Edge]]:
+def disjoin_edge_sets(edges: List[Edge]) -> List[Set[Edge]]:
+    """Splits edges into connected components, in order of first appearance. Returns sets of normalized edges. """
     edges = _normalize_edges(edges)
-    points_to_edges = {}
+    components = UnionFind()
+    for a, b in edges:
+        components.union(a, b)
+    edge_sets = {}
     for edge in edges:
-        for p in edge:
-            if p not in points_to_edges:
-                points_to_edges[p] = set()
-            points_to_edges[p].add(edge)
-    for p in points_to_edges:
-        assert(len(points_to_edges[p]) in (2, 4))
-    return points_to_edges
-
-def disjoin_edge_set(edges: List[Edge]) -> Tuple[Set[Edge], List[Edge]]:
-    """Extracts one disjoint set of edges. Returns one disjoint set and the rest. """
-    points_to_edges = _map_points_to_edges(edges=edges)
-    edge_set = set()
-    seen = set()
-    to_explore = [next(iter(points_to_edges))]
-    while to_explore:
-        p = to_explore.pop()
-        adjacent = points_to_edges[p]
-        seen.add(p)
-        for edge in adjacent:
-            edge_set.add(edge)
-            for p in edge:
-                if p not in seen:
-                    to_explore.append(p)
-    remaining_edges = []
-    for edge in edges:
-        if edge not in edge_set:
-            remaining_edges.append(edge)
-    return edge_set, remaining_edges
-
-def disjoin_edge_sets(edges: List[Edge]) -> List[List[Edge]]:
-    if not edges:
-        return []
-    edge_set, remaining_edges = disjoin_edge_set(edges)
-    edge_sets = [edge_set]
-    while remaining_edges:
-        edge_set, remaining_edges = disjoin_edge_set(remaining_edges)
-        edge_sets.append(edge_set)
-    return edge_sets
+        edge_sets.setdefault(components.find(edge[0]), set()).add(edge)
+    return list(edge_sets.values())
 
 def get_kmoves_between_tours(old_tour: Tour, new_tour: Tour) -> List[List[Edge]]:
     deleted, added = tour_difference(old_tour=old_tour, new_tour=new_tour)
@@ -161,48 +199,133 @@ def get_kmoves_between_tours(old_tour: Tour, new_tour: Tour) -> List[List[Edge]]
     return kmoves
 
 def kmove_gain(instance: Instance, kmove: List[List[Edge]]) -> int:
-    total = 0
-    for deleted in kmove[0]:
-        total += distance(instance=instance, a=deleted[0], b=deleted[1])
-    for added in kmove[1]:
-        total -= distance(instance=instance, a=added[0], b=added[1])
-    return total
+    deleted = np.array(list(kmove[0]), dtype=np.int64).reshape(-1, 2)
+    added = np.array(list(kmove[1]), dtype=np.int64).reshape(-1, 2)
+    total = distances(instance=instance, a=deleted[:, 0], b=deleted[:, 1]).sum()
+    total -= distances(instance=instance, a=added[:, 0], b=added[:, 1]).sum()
+    return int(total)
+
+def _reconnection(tour: ArrayTour, kmove: List[List[Edge]]) -> Optional[Tuple[List[int], List[Tuple[int, bool]]]]:
+    """Plans kmove on tour by segments: deleting its k edges cuts tour into k segments, and its added edges join
+    segment ends. Returns the cuts (segment j ends at position cuts[j] and starts after cuts[j - 1]) and the order
+    the segments are joined in, as (segment, forward) pairs starting with the longest segment forward,
+    or None if the result is not a single tour. O(k log k).
+    """
+    n = len(tour)
+    cuts = []
+    for a, b in kmove[0]:
+        i = tour.index(a)
+        j = tour.index(b)
+        if (i + 1) % n == j:
+            cuts.append(i)
+        else:
+            assert((j + 1) % n == i) # a deleted edge must be a tour edge.
+            cuts.append(j)
+    k = len(cuts)
+    cuts.sort()
+    if k == 0 or len(kmove[1]) != k or len(set(cuts)) < k:
+        return None
+    # the ends of segment j: (j, 0) is its first point, (j, 1) its last.
+    ends = {}
+    for j in range(k):
+        ends.setdefault(tour[(cuts[j - 1] + 1) % n], []).append((j, 0))
+        ends.setdefault(tour[cuts[j]], []).append((j, 1))
+    partner = {}
+    for a, b in kmove[1]:
+        if not ends.get(a) or not ends.get(b):
+            return None
+        end_a = ends[a].pop()
+        end_b = ends[b].pop()
+        partner[end_a] = end_b
+        partner[end_b] = end_a
+    order = [(0, True)]
+    joined = {0}
+    end = partner[(0, 1)]
+    while end != (0, 0):
+        j, side = end
+        if j in joined:
+            return None
+        joined.add(j)
+        order.append((j, side == 0))
+        end = partner[(j, 1 - side)]
+    if len(order) < k:
+        return None # the added edges close a subtour.
+    sizes = [(cuts[j] - cuts[j - 1]) % n or n for j in range(k)]
+    longest = max(range(k), key=lambda i: sizes[order[i][0]])
+    if not order[longest][1]:
+        # the same cycle, traversed the other way.
+        order = [(j, not forward) for j, forward in reversed(order)]
+        longest = k - 1 - longest
+    return cuts, order[longest:] + order[:longest]
+
+def apply_kmove_in_place(tour: ArrayTour, kmove: List[List[Edge]], gain: Optional[int] = None) -> bool:
+    """Applies kmove to tour in place, unless the result would not be a single tour. Returns True if applied.
+    The longest segment between deleted edges stays put, and only segments that move or turn around are rewritten:
+    O(k log k + length of the rewritten segments), instead of rebuilding the tour from its edge set.
+    A tracked length drops by gain (computed from the kmove if not given).
+    """
+    plan = _reconnection(tour=tour, kmove=kmove)
+    if plan is None:
+        return False
+    cuts, order = plan
+    points = tour.points
+    positions = tour.positions
+    n = len(points)
+    # the segments that move or turn around, read before any is overwritten.
+    writes = []
+    position = (cuts[order[0][0]] + 1) % n
+    for j, forward in order[1:]:
+        start = (cuts[j - 1] + 1) % n
+        size = (cuts[j] - cuts[j - 1]) % n
+        if not forward or start != position:
+            segment = [points[(start + i) % n] for i in range(size)]
+            if not forward:
+                segment.reverse()
+            writes.append((position, segment))
+        position = (position + size) % n
+    for position, segment in writes:
+        for p in segment:
+            points[position] = p
+            positions[p] = position
+            position += 1
+            if position == n:
+                position = 0
+    if tour.length is not None:
+        if gain is None:
+            dist = tour._distance
+            gain = sum(dist(a, b) for a, b in kmove[0]) - sum(dist(a, b) for a, b in kmove[1])
+        tour.length -= gain
+    return True
+
+def apply_kmove(tour: Tour, kmove: List[List[Edge]], gain: Optional[int] = None) -> Optional[Tour]:
+    """Returns tour with the kmove applied, or None if the result is not a single tour. tour is left unchanged.
+    An ArrayTour (or TwoLevelTour) gives one of the same type, whose length, if tracked, continues from tour's minus gain.
+    The move is checked and applied by segments (see apply_kmove_in_place).
+    """
+    array_tour = tour if isinstance(tour, ArrayTour) else ArrayTour(tour)
+    if _reconnection(tour=array_tour, kmove=kmove) is None:
+        return None
+    new_tour = array_tour.copy() if array_tour is tour else array_tour
+    apply_kmove_in_place(tour=new_tour, kmove=kmove, gain=gain)
+    new_tour = _same_type(tour=tour, array_tour=new_tour)
+    if gain is not None and isinstance(tour, TrackedTour) and not isinstance(tour, ArrayTour):
+        new_tour.continue_length(tour, -gain)
+    return new_tour
+
+def _same_type(tour: Tour, array_tour: ArrayTour) -> Tour:
+    """Returns array_tour as the type of tour: a list, an ArrayTour or a TwoLevelTour. """
+    if isinstance(tour, ArrayTour):
+        return array_tour
+    if isinstance(tour, TrackedTour):
+        return type(tour)(array_tour.points)
+    return array_tour.to_list()
 
-def apply_kmove(tour: Tour, kmove: List[List[Edge]]) -> Optional[Tour]:
-    edges = get_edges_from_tour(tour=tour)
-    edges = set(_normalize_edges(edges))
-    for edge in kmove[0]:
-        edges.remove(edge)
-    for edge in kmove[1]:
-        edges.add(edge)
-    points_to_edges = _map_points_to_edges(edges=edges)
-    for p in points_to_edges:
-        points_to_edges[p] = list(points_to_edges[p])
-        assert(len(points_to_edges[p]) == 2)
-    prev = next(iter(points_to_edges))
-    current = points_to_edges[prev][0][0] if points_to_edges[prev][0][0] != prev else points_to_edges[prev][0][1]
-    first = prev
-    new_tour = [prev]
-    while current != first:
-        new_tour.append(current)
-        prev_edge = _normalize_edge((current, prev))
-        next_edge = points_to_edges[current][0]
-        if prev_edge == next_edge:
-            next_edge = points_to_edges[current][1]
-        assert(prev_edge in points_to_edges[current])
-        new_prev = current
-        current = next_edge[0] if next_edge[0] != current else next_edge[1]
-        prev = new_prev
-    if len(tour) == len(new_tour):
-        assert(len(set(new_tour)) == len(new_tour))
-        return new_tour
-
-def apply_kmoves(tour: Tour, kmoves: List[List[List[Edge]]]) -> Optional[Tour]:
+def apply_kmoves(tour: Tour, kmoves: List[List[List[Edge]]], gain: Optional[int] = None) -> Optional[Tour]:
     deletes = []
     adds = []
     for kmove in kmoves:
         deletes += kmove[0]
         adds += kmove[1]
-    return apply_kmove(tour=tour, kmove=[deletes, adds])
+    return apply_kmove(tour=tour, kmove=[deletes, adds], gain=gain)
 
 
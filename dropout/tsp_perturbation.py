@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+
+# Drop-and-reinsert perturbation of a tour, done in bulk: one O(n) pass to drop the points, and one batch of
+# cheapest insertions (tsp_insertion) to put them back, with the tour length kept up to date throughout.
+
+import random
+from typing import Dict, Tuple, List, Iterable
+import tsp_insertion
+from tsp_spatial import TOUR_EDGE_CANDIDATES
+from tsp_tour import ArrayTour
+
+Instance = Dict[int, Tuple[float, float]] # point ID to coordinates
+
+def random_drop(threshold: int, max_int: int) -> bool:
+    assert(threshold < max_int)
+    return random.randint(0, max_int) < threshold
+
+def choose_points(tour: Iterable[int], threshold: int, max_int: int) -> List[int]:
+    """Returns the points of tour picked by random_drop, in tour order. """
+    return [p for p in tour if random_drop(threshold=threshold, max_int=max_int)]
+
+def drop_points(tour: ArrayTour, threshold: int, max_int: int) -> Tuple[List[int], List[int]]:
+    """Removes randomly chosen points (see random_drop) from tour in place.
+    Returns the dropped points, and the remaining points that gained a new edge (seeds for a local search).
+    """
+    dropped = choose_points(tour=tour, threshold=threshold, max_int=max_int)
+    size = len(tour)
+    ends = tour.remove_all(dropped)
+    print(f"dropped {round(len(dropped) / size * 100)} %")
+    return dropped, ends
+
+def reinsert_points(instance: Instance, tour: ArrayTour, point_ids: Iterable[int], k: int = TOUR_EDGE_CANDIDATES) -> ArrayTour:
+    """Inserts point_ids back into tour in place at their cheapest candidate edges, in one batch. Returns tour. """
+    return tsp_insertion.insert_points(instance=instance, tour=tour, point_ids=point_ids, k=k)
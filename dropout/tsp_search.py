@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+
+# Local search driven by neighbor candidate lists.
+
+from collections import deque
+from typing import Optional, Dict, Tuple, List, Sequence, Iterable
+import tsp_math
+from tsp_tour import ArrayTour # or a TwoLevelTour: the search only uses next, prev, between and reverse_path.
+
+Instance = Dict[int, Tuple[float, float]] # point ID to coordinates
+Tour = List[int]
+Neighbors = Dict[int, List[int]] # point ID to nearest other point IDs, nearest first
+
+def two_opt(instance: Instance, tour: ArrayTour, neighbors: Optional[Neighbors] = None, queue: bool = True,
+        seeds: Optional[Iterable[int]] = None) -> ArrayTour:
+    """2-opt local search. For each point a and tour neighbor b of a, moves adding an edge from a to a candidate c
+    with d(a, c) < d(a, b) are tried. Candidates are the nearest neighbors of a if neighbors is given, otherwise every point.
+    With queue, only points in an active-city queue are examined: every point starts in it, and after a move only the
+    four points whose tour edges changed are queued again (don't-look bits). Without it, all points are rescanned
+    until a full pass finds no improvement.
+    seeds, if given with queue, are the only points queued at the start, with their tour neighbors: the points
+    whose tour edges changed since tour was last a local optimum (e.g. after a perturbation).
+    Neighbors outside the tour are ignored, so the tour may cover a subset of the instance.
+    The tour is improved in place, and returned.
+    """
+    return local_search(instance=instance, tour=tour, neighbors=neighbors, operators=["2-opt"], queue=queue, seeds=seeds)
+
+def local_search(instance: Instance, tour: ArrayTour, neighbors: Optional[Neighbors] = None,
+        operators: Sequence[str] = ("2-opt",), queue: bool = True, seeds: Optional[Iterable[int]] = None) -> ArrayTour:
+    """Local search with the given move operators (keys of OPERATORS), tried in order at each point until one improves.
+    Candidates, the active-city queue, seeds and subset tours work as in two_opt.
+    The tour is improved in place, and returned.
+    """
+    n = len(tour)
+    if n < 4:
+        return tour
+    dist = tsp_math.distance_function(instance=instance)
+    improvers = [OPERATORS[name] for name in operators]
+    moves = 0
+    if queue:
+        active = deque(tour if seeds is None else _seed_points(tour, seeds))
+        queued = set(active)
+        while active:
+            a = active.popleft()
+            queued.discard(a)
+            for improver in improvers:
+                touched = improver(dist, tour, neighbors, a)
+                if touched:
+                    moves += 1
+                    for p in touched:
+                        if p not in queued:
+                            queued.add(p)
+                            active.append(p)
+                    break
+    else:
+        improved = True
+        while improved:
+            improved = False
+            for i in range(n):
+                for improver in improvers:
+                    if improver(dist, tour, neighbors, tour[i]):
+                        improved = True
+                        moves += 1
+                        break
+    print(f"{'/'.join(operators)} done after {moves} improvements.")
+    return tour
+
+def _seed_points(tour: ArrayTour, seeds: Iterable[int]) -> List[int]:
+    """Returns the seeds in tour and their tour neighbors, without repeats. """
+    points = []
+    seen = set()
+    for s in seeds:
+        if s not in tour:
+            continue
+        for p in (tour.prev(s), s, tour.next(s)):
+            if p not in seen:
+                seen.add(p)
+                points.append(p)
+    return points
+
+def two_opt_move(tour: ArrayTour, a: int, b: int, c: int, d: int):
+    """2-opt move removing tour edges (a, b) and (c, d) and adding (a, c) and (b, d).
+    b must follow a and d follow c in the same direction, either both successors or both predecessors.
+    """
+    if b == c or a == d:
+        return # the added edges are the removed ones.
+    if tour.next(a) == b:
+        assert(tour.next(c) == d)
+        tour.reverse_path(b, c)
+    else:
+        assert(tour.prev(a) == b and tour.prev(c) == d)
+        tour.reverse_path(a, d)
+
+def _improve_point(dist, tour: ArrayTour, neighbors: Optional[Neighbors], a: int) -> Tuple[int, ...]:
+    """Applies the first improving candidate 2-opt move that removes a tour edge of a.
+    Returns the endpoints of the changed edges, or an empty tuple if no improving move was found.
+    """
+    candidates = tour if neighbors is None else neighbors[a]
+    for successor in (True, False):
+        step = tour.next if successor else tour.prev
+        b = step(a)
+        ab = dist(a, b)
+        for c in candidates:
+            if c not in tour:
+                continue
+            ac = dist(a, c)
+            if ac >= ab:
+                if neighbors is None:
+                    continue
+                break # neighbors are sorted by distance.
+            d = step(c)
+            if c == a or c == b or d == a:
+                continue
+            if ac + dist(b, d) < ab + dist(c, d):
+                if successor:
+                    # a b ... c d -> a c ... b d
+                    tour.reverse_path(b, c)
+                else:
+                    # d c ... b a -> d b ... c a
+                    tour.reverse_path(c, b)
+                return (a, b, c, d)
+    return ()
+
+def _or_opt_point(dist, tour: ArrayTour, neighbors: Optional[Neighbors], a: int) -> Tuple[int, ...]:
+    """Applies the first improving Or-opt move of a segment of up to MAX_SEGMENT points that ends at a.
+    The segment s1 ... s2 is removed from between p and nx, and inserted, reversed or not, into a tour edge (c, d)
+    with c a candidate of a, tried while d(a, c) is below the gain of removing the segment.
+    Returns the endpoints of the changed edges, or an empty tuple if no improving move was found.
+    """
+    n = len(tour)
+    for length in range(1, MAX_SEGMENT + 1):
+        if length + 3 > n:
+            break
+        for forward in (True, False):
+            if forward:
+                s1 = a
+                s2 = a
+                for _ in range(length - 1):
+                    s2 = tour.next(s2)
+            else:
+                s2 = a
+                s1 = a
+                for _ in range(length - 1):
+                    s1 = tour.prev(s1)
+            p = tour.prev(s1)
+            nx = tour.next(s2)
+            removal_gain = dist(p, s1) + dist(s2, nx) - dist(p, nx)
+            if removal_gain <= 0:
+                continue
+            other = s2 if a == s1 else s1
+            candidates = tour if neighbors is None else neighbors[a]
+            for c in candidates:
+                if c not in tour:
+                    continue
+                ac = dist(a, c)
+                if ac >= removal_gain:
+                    if neighbors is None:
+                        continue
+                    break # neighbors are sorted by distance.
+                if tour.between(s1, c, s2):
+                    continue
+                # a is joined to c from either side: insert into (c, next(c)) or (prev(c), c).
+                for e in (tour.next(c), tour.prev(c)):
+                    if e == s1 or e == s2:
+                        continue
+                    gain = removal_gain + dist(c, e) - ac - dist(other, e)
+                    if gain <= 0:
+                        continue
+                    # the edge (u, v), with v = next(u), receives segment ends (u, x) and (y, v).
+                    if e == tour.next(c):
+                        u, v, x, _ = c, e, a, other
+                    else:
+                        u, v, x, _ = e, c, other, a
+                    _or_move(tour, p, s1, s2, nx, u, v, reverse=(x == s2))
+                    return (p, s1, s2, nx, c, e)
+    return ()
+
+def _or_move(tour: ArrayTour, p: int, s1: int, s2: int, nx: int, u: int, v: int, reverse: bool):
+    """Moves the segment s1 ... s2 (p before it, nx after it) into the tour edge (u, v), with v = next(u).
+    Joins (u, s1) and (s2, v), or (u, s2) and (s1, v) with reverse.
+    """
+    # p s1 ... s2 nx ... u v  ->  p u ... nx s2 ... s1 v
+    two_opt_move(tour, p, s1, u, v)
+    # p u ... nx s2 ... s1 v  ->  p nx ... u s2 ... s1 v
+    two_opt_move(tour, p, u, nx, s2)
+    if not reverse:
+        # u s2 ... s1 v  ->  u s1 ... s2 v
+        two_opt_move(tour, u, s2, s1, v)
+
+def _or_3opt_point(dist, tour: ArrayTour, neighbors: Optional[Neighbors], a: int) -> Tuple[int, ...]:
+    """Applies the first improving segment-insertion 3-opt move (the "or-3opt" reconnection) that removes a tour edge of a.
+    With t1 = a, t2 its successor (or predecessor), t3 a candidate of t2, t4 after t3 and t5 a candidate of t4
+    between t2 and t3 with t6 after it, edges (t1, t2), (t3, t4), (t5, t6) are replaced by (t2, t3), (t4, t5), (t6, t1).
+    The path t2 ... t5 then moves, unreversed, between t3 and t4. Candidates are tried while the partial gain is positive.
+    Returns the endpoints of the changed edges, or an empty tuple if no improving move was found.
+    """
+    if len(tour) < 6:
+        return ()
+    t1 = a
+    for successor in (True, False):
+        step = tour.next if successor else tour.prev
+        t2 = step(t1)
+        d12 = dist(t1, t2)
+        candidates = tour if neighbors is None else neighbors[t2]
+        for t3 in candidates:
+            if t3 not in tour:
+                continue
+            g1 = d12 - dist(t2, t3)
+            if g1 <= 0:
+                if neighbors is None:
+                    continue
+                break # neighbors are sorted by distance.
+            if t3 == t1 or t3 == t2:
+                continue
+            t4 = step(t3)
+            if t4 == t2:
+                continue
+            d34 = dist(t3, t4)
+            candidates5 = tour if neighbors is None else neighbors[t4]
+            for t5 in candidates5:
+                if t5 not in tour:
+                    continue
+                g2 = g1 + d34 - dist(t4, t5)
+                if g2 <= 0:
+                    if neighbors is None:
+                        continue
+                    break
+                if t5 == t3:
+                    continue
+                # t5 must lie on the path t2 ... t3.
+                if successor and not tour.between(t2, t5, t3):
+                    continue
+                if not successor and not tour.between(t3, t5, t2):
+                    continue
+                t6 = step(t5)
+                if g2 + dist(t5, t6) - dist(t6, t1) <= 0:
+                    continue
+                # t1 t2 ... t5 t6 ... t3 t4  ->  t1 t6 ... t3 t2 ... t5 t4
+                two_opt_move(tour, t1, t2, t3, t4)
+                two_opt_move(tour, t1, t3, t6, t5)
+                two_opt_move(tour, t3, t5, t2, t4)
+                return (t1, t2, t3, t4, t5, t6)
+    return ()
+
+MAX_SEGMENT = 3 # longest segment moved by Or-opt.
+
+OPERATORS = {
+    "2-opt": _improve_point,
+    "or-opt": _or_opt_point,
+    "or-3opt": _or_3opt_point,
+}
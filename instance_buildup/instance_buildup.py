@@ -6,6 +6,12 @@ from tsp_types import Instance, Tour
 import random
 import two_opt
 import tsp_math
+import tsp_neighbors
+from tsp_tour import ArrayTour
+from tsp_insertion import TourInserter
+
+NEIGHBORS = 10 # candidate neighbors per point for 2-opt.
+BATCH_FRACTION = 0.125 # points inserted between searches, as a fraction of the tour size.
 
 def make_randomized_tour(instance: Instance) -> Tour:
     tour = list(instance.keys())
@@ -15,18 +21,30 @@ def make_randomized_tour(instance: Instance) -> Tour:
 def hill_climb(instance: Instance) -> Tour:
     remaining_points = make_randomized_tour(instance=instance)
     INITIAL_TOUR_SIZE = 4
-    tour = remaining_points[-INITIAL_TOUR_SIZE:]
+    # an ArrayTour keeps its length up to date through 2-opt and insertions.
+    tour = ArrayTour(remaining_points[-INITIAL_TOUR_SIZE:])
     remaining_points = remaining_points[:-INITIAL_TOUR_SIZE]
     assert(len(instance) == len(remaining_points) + len(tour))
+    inserter = TourInserter(instance=instance, point_ids=tour)
+    tour = two_opt.hill_climb(instance=instance, tour=tour)
     while remaining_points:
         print(f"current tour len: {len(tour)}")
-        tour = two_opt.hill_climb(instance=instance, tour=tour)
-        tour = tsp_math.min_cost_insertion(instance=instance, tour=tour, new_point_id=remaining_points.pop())
+        # batches grow with the tour, so the O(n) work per batch (rebuilding and copying the tour, neighbor lists)
+        # adds up to O(n) per doubling instead of per point.
+        batch_size = max(1, int(len(tour) * BATCH_FRACTION))
+        batch = remaining_points[-batch_size:]
+        del remaining_points[-batch_size:]
+        inserter.insert_all(tour, batch)
+        # the inserter indexes exactly the tour's points.
+        neighbors = tsp_neighbors.nearest_neighbors(instance=instance, k=NEIGHBORS, spatial_index=inserter.index,
+            point_ids=tour)
+        # the tour was a local optimum before the insertions, so only the search around the new points is needed.
+        tour = two_opt.hill_climb(instance=instance, tour=tour, neighbors=neighbors, seeds=batch)
     assert(len(instance) == len(tour))
-    return two_opt.hill_climb(instance=instance, tour=tour)
+    return tour
 
 if __name__ == "__main__":
-    instance = tsp_reader.read_instance(sys.argv[1])
+    instance = tsp_reader.load_instance(sys.argv[1])
     tour = hill_climb(instance=instance)
     tour_length = tsp_math.tour_length(instance=instance, tour=tour)
     print(f"final tour length: {tour_length}")
@@ -0,0 +1,439 @@
+#!/usr/bin/env python3
+
+# Tour representations: position-indexed (ArrayTour) and two-level segment list (TwoLevelTour).
+
+import math
+from typing import Optional, Iterable, Iterator, List, Tuple, Callable
+
+TWO_LEVEL_SIZE = 20000 # tours at least this long are built as TwoLevelTours by new_tour.
+
+class TrackedTour:
+    """Length tracking shared by the tour representations.
+    Once track_length is called, every change to the tour adjusts length by the change in tour length,
+    so the length never has to be measured again (see tsp_math.tour_length).
+    """
+
+    def __init__(self):
+        self.length = None # tour length, if tracked.
+        self.length_source = None # what length is measured on (the instance), if tracked.
+        self._distance = None # distance function length is tracked with.
+
+    def track_length(self, source, distance: Callable[[int, int], int], length: int):
+        """Starts tracking length, currently length as measured with distance on source. """
+        self.length = length
+        self.length_source = source
+        self._distance = distance
+
+    def continue_length(self, other: "TrackedTour", delta: int):
+        """Tracks length as that of other, changed by delta, if other's length is tracked. """
+        if other.length is not None:
+            self.track_length(source=other.length_source, distance=other._distance, length=other.length + delta)
+
+    def tracked_length(self, source) -> Optional[int]:
+        """Returns the tracked length, if it is measured on source. """
+        return self.length if self.length_source is source else None
+
+    def __getstate__(self) -> dict:
+        # the distance function may not be picklable; the tour arrives untracked.
+        state = dict(self.__dict__)
+        state["length"] = None
+        state["length_source"] = None
+        state["_distance"] = None
+        return state
+
+class ArrayTour(TrackedTour):
+    """Tour stored as a list of point IDs plus the inverse list of positions (point ID -> index in the tour).
+    Successor, predecessor and position lookups are O(1), and path reversals happen in place on the shorter side.
+    Supports the list operations the solvers use on a Tour (len, iteration, [], index), so it can be passed
+    to the tsp_math helpers.
+    Every reverse, insert and remove keeps a tracked length (see TrackedTour) up to date.
+    """
+
+    def __init__(self, points: Iterable[int] = ()):
+        super().__init__()
+        self.points = list(points) # position -> point ID
+        self.positions = [] # point ID -> position, -1 if the point is not in the tour.
+        self._update_positions(0)
+
+    def _update_positions(self, start: int, new_id: Optional[int] = None):
+        """Refreshes positions of the points at index start onwards.
+        new_id, if given, is the only one of them that may be missing from positions.
+        """
+        points = self.points
+        positions = self.positions
+        max_id = new_id if new_id is not None else max(points[start:], default=-1)
+        if max_id >= len(positions):
+            positions.extend([-1] * (max_id + 1 - len(positions)))
+        for i in range(start, len(points)):
+            positions[points[i]] = i
+
+    def __len__(self) -> int:
+        return len(self.points)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.points)
+
+    def __getitem__(self, i):
+        return self.points[i]
+
+    def __contains__(self, point_id: int) -> bool:
+        return 0 <= point_id < len(self.positions) and self.positions[point_id] >= 0
+
+    def index(self, point_id: int) -> int:
+        if point_id not in self:
+            raise ValueError(f"{point_id} is not in tour")
+        return self.positions[point_id]
+
+    def copy(self) -> "ArrayTour":
+        tour = ArrayTour()
+        tour.points = self.points[:]
+        tour.positions = self.positions[:]
+        tour.continue_length(self, 0)
+        return tour
+
+    def set_points(self, points: Iterable[int], delta: int = 0):
+        """Replaces the tour by points (e.g. after a batch of changes made on another representation), in O(n).
+        A tracked length is adjusted by delta, the change in length.
+        """
+        for p in self.points:
+            self.positions[p] = -1
+        self.points = list(points)
+        self._update_positions(0)
+        if self.length is not None:
+            self.length += delta
+
+    def to_list(self) -> List[int]:
+        return self.points[:]
+
+    def next(self, point_id: int) -> int:
+        i = self.positions[point_id] + 1
+        return self.points[i if i < len(self.points) else 0]
+
+    def prev(self, point_id: int) -> int:
+        return self.points[self.positions[point_id] - 1]
+
+    def between(self, a: int, b: int, c: int) -> bool:
+        """Returns True if b lies on the forward path from a to c (inclusive). """
+        i = self.positions[a]
+        j = self.positions[b]
+        k = self.positions[c]
+        if i <= k:
+            return i <= j <= k
+        return j >= i or j <= k
+
+    def reverse(self, i: int, j: int):
+        """Reverses the path from position i forward to position j in place.
+        Reversing the rest of the tour instead gives the same cycle, so the shorter of the two is reversed.
+        """
+        points = self.points
+        positions = self.positions
+        n = len(points)
+        length = (j - i) % n + 1
+        if self.length is not None and length < n:
+            dist = self._distance
+            a = points[i - 1]
+            b = points[i]
+            c = points[j]
+            d = points[(j + 1) % n]
+            # a b ... c d -> a c ... b d
+            self.length += dist(a, c) + dist(b, d) - dist(a, b) - dist(c, d)
+        if 2 * length > n:
+            i, j = (j + 1) % n, (i - 1) % n
+            length = n - length
+        for _ in range(length // 2):
+            a = points[i]
+            b = points[j]
+            points[i] = b
+            positions[b] = i
+            points[j] = a
+            positions[a] = j
+            i += 1
+            if i == n:
+                i = 0
+            j -= 1
+            if j < 0:
+                j = n - 1
+
+    def reverse_path(self, a: int, b: int):
+        """Reverses the forward path from point a to point b in place. """
+        self.reverse(self.positions[a], self.positions[b])
+
+    def insert(self, i: int, point_id: int):
+        """Inserts point_id before position i. O(n - i). """
+        assert(point_id not in self)
+        points = self.points
+        if self.length is not None and points:
+            dist = self._distance
+            a = points[i - 1]
+            b = points[i % len(points)]
+            self.length += dist(a, point_id) + dist(point_id, b) - dist(a, b)
+        points.insert(i, point_id)
+        self._update_positions(i, point_id)
+
+    def remove(self, point_id: int):
+        """Removes point_id from the tour. O(n - position). """
+        i = self.index(point_id)
+        if self.length is not None:
+            dist = self._distance
+            a = self.prev(point_id)
+            b = self.next(point_id)
+            self.length += dist(a, b) - dist(a, point_id) - dist(point_id, b)
+        del self.points[i]
+        self.positions[point_id] = -1
+        self._update_positions(i, point_id)
+
+    def remove_all(self, point_ids: Iterable[int]) -> List[int]:
+        """Removes point_ids from the tour in one O(n) pass, instead of O(n) per point.
+        Returns the remaining points that gained a new edge (the ends of each run of removed points).
+        """
+        removed = set(point_ids)
+        if not removed:
+            return []
+        points = self.points
+        positions = self.positions
+        for p in removed:
+            assert(p in self)
+        kept = [p for p in points if p not in removed]
+        # each run of removed points is bridged by a new edge (u, v).
+        bridges = [(u, v) for u, v in zip(kept, kept[1:] + kept[:1]) if self.next(u) in removed]
+        if self.length is not None:
+            dist = self._distance
+            delta = 0
+            for a, b in zip(points, points[1:] + points[:1]):
+                if a in removed or b in removed:
+                    delta -= dist(a, b)
+            for u, v in bridges:
+                delta += dist(u, v)
+            self.length += delta
+        for p in removed:
+            positions[p] = -1
+        self.points = kept
+        self._update_positions(0)
+        ends = []
+        for u, v in bridges:
+            ends.append(u)
+            if v != u:
+                ends.append(v)
+        return ends
+
+class TwoLevelTour(TrackedTour):
+    """Tour stored as a ring of segments of about sqrt(n) points (two-level doubly-linked list). Each segment is a list
+    of point IDs with a reversal bit, read back to front when set.
+    next, prev and between are O(1). reverse_path (the 2-opt flip) reverses within a segment, or splits at most two
+    segments and reverses the run of whole segments between, toggling their bits: O(sqrt(n)) instead of the up to
+    n / 2 points an ArrayTour moves. Splits only shrink segments, so they are rebuilt to even sizes once their number doubles.
+    Supports the same lookups, iteration, copy, set_points and length tracking as ArrayTour, but not insert or remove.
+    """
+
+    def __init__(self, points: Iterable[int] = ()):
+        super().__init__()
+        self._build(points)
+
+    def _build(self, points: Iterable[int]):
+        points = list(points)
+        size = max(1, math.isqrt(len(points)))
+        self.segments = [points[i:i + size] for i in range(0, len(points), size)] # segment -> point IDs.
+        self.reversed = [False] * len(self.segments) # segment -> reversal bit.
+        self.order = list(range(len(self.segments))) # tour position -> segment.
+        self.ranks = list(range(len(self.segments))) # segment -> tour position.
+        self.max_segments = 2 * len(self.segments) + 2
+        self.count = len(points)
+        self.segment_of = [-1] * (max(points, default=-1) + 1) # point ID -> segment, -1 if the point is not in the tour.
+        self.offsets = [0] * len(self.segment_of) # point ID -> index in its segment.
+        for s, segment in enumerate(self.segments):
+            for i, p in enumerate(segment):
+                self.segment_of[p] = s
+                self.offsets[p] = i
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __iter__(self) -> Iterator[int]:
+        for s in self.order:
+            if self.reversed[s]:
+                yield from reversed(self.segments[s])
+            else:
+                yield from self.segments[s]
+
+    def __getitem__(self, i: int) -> int:
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError("tour index out of range")
+        for s in self.order:
+            segment = self.segments[s]
+            if i < len(segment):
+                return segment[-1 - i] if self.reversed[s] else segment[i]
+            i -= len(segment)
+
+    def __contains__(self, point_id: int) -> bool:
+        return 0 <= point_id < len(self.segment_of) and self.segment_of[point_id] >= 0
+
+    def _sequence(self, point_id: int) -> Tuple[int, int]:
+        """Returns the rank of the segment of point_id and its index within the segment, in tour order. """
+        s = self.segment_of[point_id]
+        i = self.offsets[point_id]
+        return (self.ranks[s], len(self.segments[s]) - 1 - i if self.reversed[s] else i)
+
+    def index(self, point_id: int) -> int:
+        """Position of point_id in tour order. O(sqrt(n)). """
+        if point_id not in self:
+            raise ValueError(f"{point_id} is not in tour")
+        rank, i = self._sequence(point_id)
+        return sum(len(self.segments[s]) for s in self.order[:rank]) + i
+
+    def copy(self) -> "TwoLevelTour":
+        tour = TwoLevelTour()
+        tour.segments = [segment[:] for segment in self.segments]
+        tour.reversed = self.reversed[:]
+        tour.order = self.order[:]
+        tour.ranks = self.ranks[:]
+        tour.max_segments = self.max_segments
+        tour.count = self.count
+        tour.segment_of = self.segment_of[:]
+        tour.offsets = self.offsets[:]
+        tour.continue_length(self, 0)
+        return tour
+
+    def set_points(self, points: Iterable[int], delta: int = 0):
+        """Replaces the tour by points, in O(n). A tracked length is adjusted by delta, the change in length. """
+        self._build(points)
+        if self.length is not None:
+            self.length += delta
+
+    def to_list(self) -> List[int]:
+        return list(self)
+
+    def _first(self, s: int) -> int:
+        return self.segments[s][-1] if self.reversed[s] else self.segments[s][0]
+
+    def _last(self, s: int) -> int:
+        return self.segments[s][0] if self.reversed[s] else self.segments[s][-1]
+
+    def next(self, point_id: int) -> int:
+        s = self.segment_of[point_id]
+        segment = self.segments[s]
+        i = self.offsets[point_id]
+        if self.reversed[s]:
+            if i > 0:
+                return segment[i - 1]
+        elif i + 1 < len(segment):
+            return segment[i + 1]
+        rank = self.ranks[s] + 1
+        return self._first(self.order[rank if rank < len(self.order) else 0])
+
+    def prev(self, point_id: int) -> int:
+        s = self.segment_of[point_id]
+        segment = self.segments[s]
+        i = self.offsets[point_id]
+        if self.reversed[s]:
+            if i + 1 < len(segment):
+                return segment[i + 1]
+        elif i > 0:
+            return segment[i - 1]
+        return self._last(self.order[self.ranks[s] - 1])
+
+    def between(self, a: int, b: int, c: int) -> bool:
+        """Returns True if b lies on the forward path from a to c (inclusive). """
+        i = self._sequence(a)
+        j = self._sequence(b)
+        k = self._sequence(c)
+        if i <= k:
+            return i <= j <= k
+        return j >= i or j <= k
+
+    def reverse_path(self, a: int, b: int):
+        """Reverses the forward path from point a to point b in place. """
+        if a == b:
+            return
+        p = self.prev(a)
+        n = self.next(b)
+        if n == a:
+            return # the whole tour: the same cycle.
+        if self.length is not None:
+            dist = self._distance
+            # p a ... b n -> p b ... a n
+            self.length += dist(p, b) + dist(a, n) - dist(p, a) - dist(b, n)
+        s = self.segment_of[a]
+        if s == self.segment_of[b]:
+            i = self._sequence(a)[1]
+            j = self._sequence(b)[1]
+            if i <= j:
+                self._reverse_within(s, a, b)
+                return
+            # the path leaves the segment and comes back: the rest of the tour lies within it.
+            self._reverse_within(s, n, p)
+            return
+        self._split_before(a)
+        self._split_after(b)
+        m = len(self.order)
+        first = self.ranks[self.segment_of[a]]
+        last = self.ranks[self.segment_of[b]]
+        count = (last - first) % m + 1
+        if 2 * count > m:
+            # reversing the other segments gives the same cycle.
+            first, last = (last + 1) % m, (first - 1) % m
+            count = m - count
+        ranks = [(first + k) % m for k in range(count)]
+        segments = [self.order[r] for r in ranks]
+        for r, s in zip(ranks, reversed(segments)):
+            self.order[r] = s
+            self.ranks[s] = r
+            self.reversed[s] = not self.reversed[s]
+        if m > self.max_segments:
+            self._build(list(self))
+
+    def _reverse_within(self, s: int, a: int, b: int):
+        """Reverses the path from a to b, both in segment s. """
+        segment = self.segments[s]
+        i = self.offsets[a]
+        j = self.offsets[b]
+        if i > j:
+            i, j = j, i
+        segment[i:j + 1] = segment[i:j + 1][::-1]
+        offsets = self.offsets
+        for k in range(i, j + 1):
+            offsets[segment[k]] = k
+
+    def _split_before(self, point_id: int):
+        """Splits the segment of point_id so that point_id is the first point of its segment. """
+        s = self.segment_of[point_id]
+        i = self.offsets[point_id]
+        if self.reversed[s]:
+            if i + 1 < len(self.segments[s]):
+                self._split(s, i + 1)
+        elif i > 0:
+            self._split(s, i)
+
+    def _split_after(self, point_id: int):
+        """Splits the segment of point_id so that point_id is the last point of its segment. """
+        s = self.segment_of[point_id]
+        i = self.offsets[point_id]
+        if self.reversed[s]:
+            if i > 0:
+                self._split(s, i)
+        elif i + 1 < len(self.segments[s]):
+            self._split(s, i + 1)
+
+    def _split(self, s: int, i: int):
+        """Moves the points of segment s from index i onwards into a new segment, next to s in tour order. """
+        segment = self.segments[s]
+        tail = segment[i:]
+        del segment[i:]
+        t = len(self.segments)
+        self.segments.append(tail)
+        self.reversed.append(self.reversed[s])
+        self.ranks.append(0)
+        for k, p in enumerate(tail):
+            self.segment_of[p] = t
+            self.offsets[p] = k
+        # the tail follows s in tour order, or precedes it if s is reversed.
+        rank = self.ranks[s] + (0 if self.reversed[s] else 1)
+        self.order.insert(rank, t)
+        for r in range(rank, len(self.order)):
+            self.ranks[self.order[r]] = r
+
+def new_tour(points: Iterable[int]) -> TrackedTour:
+    """Returns points as a TwoLevelTour if there are at least TWO_LEVEL_SIZE of them, otherwise as an ArrayTour. """
+    points = list(points)
+    return TwoLevelTour(points) if len(points) >= TWO_LEVEL_SIZE else ArrayTour(points)
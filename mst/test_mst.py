@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+
+# Checks mst against brute-force Kruskal over all point pairs. Run with: python3 -m pytest mst
+# (with scipy, mst triangulates; test_prim_fallback_is_exact covers the fallback either way).
+
+import random
+from typing import Dict, Tuple, List
+
+import mst
+from union_find import UnionFind
+
+Instance = Dict[int, Tuple[float, float]]
+
+def clustered_instance(seed: int) -> Instance:
+    """Points in a few tight, far-apart clusters: the k-nearest neighbor graph of such inputs misses MST edges. """
+    rng = random.Random(seed)
+    instance = {}
+    for _ in range(rng.randint(2, 6)):
+        cx = rng.uniform(0, 10000)
+        cy = rng.uniform(0, 10000)
+        spread = rng.uniform(10, 500)
+        for _ in range(rng.randint(1, 30)):
+            instance[len(instance) + 1] = (round(rng.gauss(cx, spread)), round(rng.gauss(cy, spread)))
+    return instance
+
+def brute_force_weight(instance: Instance) -> int:
+    ids = list(instance)
+    edges = sorted(mst.make_edge(instance, a=a, b=b) for i, a in enumerate(ids) for b in ids[i + 1:])
+    components = UnionFind()
+    return sum(e[0] for e in edges if components.union(e[1], e[2]))
+
+def weight(instance: Instance, edges: List[Tuple[int, int]]) -> int:
+    return sum(mst.make_edge(instance, a=a, b=b)[0] for a, b in edges)
+
+def check(instance: Instance):
+    edges = mst.mst(instance=instance)
+    assert(len(edges) == len(instance) - 1)
+    components = UnionFind()
+    for a, b in edges:
+        assert(components.union(a, b))
+    assert(weight(instance, edges) == brute_force_weight(instance))
+
+def test_prim_fallback_is_exact(monkeypatch):
+    monkeypatch.setattr(mst, "Delaunay", None)
+    for seed in range(300):
+        check(clustered_instance(seed))
+
+def test_mst_is_exact():
+    for seed in range(300, 330):
+        check(clustered_instance(seed))
+
+def test_duplicate_points():
+    check({1: (0, 0), 2: (0, 0), 3: (5, 5), 4: (5, 5), 5: (100, 0)})
+
+def test_many_duplicate_points():
+    for seed in range(330, 360):
+        instance = {p: (x // 200 * 200, y // 200 * 200) for p, (x, y) in clustered_instance(seed).items()}
+        check(instance)
@@ -1,39 +1,87 @@
 #!/usr/bin/env python3
 
-from typing import Dict, Tuple, List
+from array import array
+from typing import Dict, List, TextIO
+from tsp_instance import ArrayInstance, ABSENT
+import tsp_cache
 
-def read_instance(path: str) -> Dict[int, Tuple[float, float]]:
-    """Reads a TSPLIB-formatted TSP instance (not tour) file, and returns it as a dict of point ID to coordinates. """
-    instance = {}
+def _read_header(f: TextIO, section: str) -> Dict[str, str]:
+    """Reads "KEY : VALUE" specification lines up to the line starting the given data section. """
+    header = {}
+    for line in f:
+        line = line.strip()
+        if line.startswith(section):
+            return header
+        if line == "EOF":
+            break
+        if ":" in line:
+            key, value = line.split(":", 1)
+            header[key.strip()] = value.strip()
+    raise ValueError(f"No {section} found.")
+
+def read_instance(path: str) -> ArrayInstance:
+    """Reads a TSPLIB-formatted TSP instance (not tour) file, and returns it as an ArrayInstance of point ID to coordinates.
+    The specification part (NAME, TYPE, DIMENSION, EDGE_WEIGHT_TYPE, ...) is kept in the instance's header dict.
+    Raises ValueError for edge weight types other than EUC_2D, and for coordinate sections that disagree with DIMENSION.
+    """
     with open(path, "r") as f:
-        for line in f:
-            if "NODE_COORD_SECTION" in line:
-                break
-        for line in f:
-            line = line.strip()
-            if "EOF" in line or not line:
-                break
-            fields = line.strip().split()
-            point_id = int(fields[0])
-            x = float(fields[1])
-            y = float(fields[2])
-            instance[point_id] = (x, y)
+        header = _read_header(f, "NODE_COORD_SECTION")
+        edge_weight_type = header.get("EDGE_WEIGHT_TYPE", "EUC_2D")
+        if edge_weight_type != "EUC_2D":
+            raise ValueError(f"{path}: unsupported EDGE_WEIGHT_TYPE {edge_weight_type}; only EUC_2D is supported.")
+        # the coordinate section is parsed in bulk: whitespace-separated (ID, x, y) triples, up to EOF.
+        fields = f.read().split()
+    if fields and fields[-1] == "EOF":
+        fields.pop()
+    elif "EOF" in fields:
+        fields = fields[:fields.index("EOF")]
+    if len(fields) % 3 != 0:
+        raise ValueError(f"{path}: NODE_COORD_SECTION is not made of (ID, x, y) lines.")
+    dimension = int(header.get("DIMENSION", len(fields) // 3))
+    if len(fields) // 3 != dimension:
+        raise ValueError(f"{path}: DIMENSION is {dimension}, but {len(fields) // 3} points were found.")
+    instance = ArrayInstance()
+    instance.header = header
+    instance.ids = array("q", map(int, fields[0::3]))
+    xs = array("d", map(float, fields[1::3]))
+    ys = array("d", map(float, fields[2::3]))
+    size = max(instance.ids, default=-1) + 1
+    if instance.ids == array("q", range(size - dimension, size)):
+        # dense IDs (the TSPLIB convention, 1 to DIMENSION): coordinates are already in ID order.
+        padding = array("d", [ABSENT]) * (size - dimension)
+        instance.x = padding + xs
+        instance.y = padding + ys
+    else:
+        instance.x = array("d", [ABSENT]) * size
+        instance.y = array("d", [ABSENT]) * size
+        for i, point_id in enumerate(instance.ids):
+            instance.x[point_id] = xs[i]
+            instance.y[point_id] = ys[i]
+        if len(set(instance.ids)) != dimension:
+            raise ValueError(f"{path}: duplicate point IDs in NODE_COORD_SECTION.")
+    return instance
+
+def load_instance(path: str) -> ArrayInstance:
+    """Same as read_instance, but through a binary sidecar cache next to the instance file (see tsp_cache).
+    The first load parses the file and writes the cache; later loads memory-map it, until the instance file changes.
+    """
+    instance = tsp_cache.read_cache(path)
+    if instance is None:
+        instance = read_instance(path)
+        tsp_cache.write_cache(path, instance)
     return instance
 
 def read_tour(path: str) -> List[int]:
     """Reads a TSPLIB-formatted TSP tour file, and returns it in the form of an ordered list of point IDs. """
     tour = []
     with open(path, "r") as f:
-        for line in f:
-            if "TOUR_SECTION" in line:
-                break
-        for line in f:
-            line = line.strip()
-            if "-1" in line or "EOF" in line or not line:
+        header = _read_header(f, "TOUR_SECTION")
+        for token in f.read().split():
+            if token == "-1" or token == "EOF":
                 break
-            fields = line.strip().split()
-            point_id = int(fields[0])
-            tour.append(point_id)
+            tour.append(int(token))
+    if "DIMENSION" in header and int(header["DIMENSION"]) != len(tour):
+        raise ValueError(f"{path}: DIMENSION is {header['DIMENSION']}, but {len(tour)} points were found.")
     return tour
 
 import sys
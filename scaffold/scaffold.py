@@ -4,9 +4,12 @@ import tsp_reader
 import mst
 import two_opt
 import sys
-from typing import List
+from typing import Optional, List
 from tsp_types import Edge, Tour, Instance
 import tsp_math
+import tsp_cache
+import tsp_insertion
+from tsp_tour import ArrayTour
 
 def normalize_edge(edge: Edge) -> Edge:
     a, b = edge
@@ -25,27 +28,29 @@ def get_new_edges(tour: Tour, edges: List[Edge]) -> List[Edge]:
             new_edges.append(edge)
     return new_edges
 
-def hill_climb(original_instance: Instance, tour: Tour) -> Tour:
+def hill_climb(original_instance: Instance, tour: Tour, mst_edges: Optional[List[Edge]] = None) -> Tour:
+    """mst_edges is the MST of original_instance, computed here if not given. """
     instance = original_instance.copy()
-    original_tour = tour[:]
+    original_tour = tour
+    # a fresh ArrayTour tracks its length on the augmented instance through insertions, 2-opt and removals.
+    tour = ArrayTour(tour)
     initial_tour_length = tsp_math.tour_length(instance=instance, tour=tour)
-    mst_edges = mst.mst(instance=instance)
+    if mst_edges is None:
+        mst_edges = mst.mst(instance=instance)
     new_edges = get_new_edges(tour=tour, edges=mst_edges)
     print(f"adding {len(new_edges)} new mst edges.")
     new_point_ids = tsp_math.add_midpoints_to_instance(instance=instance, edges=new_edges)
     print(f"new instance size: {len(instance)}")
     tour_set = set(tour)
-    for point_id in instance:
-        if point_id in tour_set:
-            continue
-        tour = tsp_math.min_cost_insertion(instance=instance, tour=tour, new_point_id=point_id)
-    tour = two_opt.hill_climb(instance=instance, tour=tour)
+    inserted = [p for p in instance if p not in tour_set]
+    tsp_insertion.insert_points(instance=instance, tour=tour, point_ids=inserted)
+    # only the neighborhoods of the inserted and removed points changed, so the 2-opt searches start there.
+    tour = two_opt.hill_climb(instance=instance, tour=tour, seeds=inserted)
     augmented_size = len(tour)
     print(f"augmented tour length: {tsp_math.tour_length(instance=instance, tour=tour)}")
-    for p in new_point_ids:
-        tour.remove(p)
+    ends = tour.remove_all(new_point_ids)
     print(f"reduced tour length: {tsp_math.tour_length(instance=instance, tour=tour)}")
-    tour = two_opt.hill_climb(instance=instance, tour=tour)
+    tour = two_opt.hill_climb(instance=instance, tour=tour, seeds=ends)
     final_local_optimum = tsp_math.tour_length(instance=instance, tour=tour)
     print(f"final tour length: {final_local_optimum}")
     assert(len(tour) + len(new_point_ids) == augmented_size)
@@ -58,8 +63,9 @@ def hill_climb(original_instance: Instance, tour: Tour) -> Tour:
 
 if __name__ == "__main__":
     instance_file = sys.argv[1]
-    instance = tsp_reader.read_instance(instance_file)
+    instance = tsp_reader.load_instance(instance_file)
     tour = two_opt.hill_climb(instance=instance, tour=None, randomize=True)
+    mst_edges = tsp_cache.load_or_compute(instance_file, "mst", lambda: mst.mst(instance=instance), method=mst.METHOD)
 
     while True:
-        tour = hill_climb(original_instance=instance, tour=tour)
+        tour = hill_climb(original_instance=instance, tour=tour, mst_edges=mst_edges)
@@ -1,14 +1,23 @@
 #!/usr/bin/env python3
 
-from typing import Tuple, List
+from typing import Tuple, List, Optional, Callable
 from tsp_types import Instance, Tour, Edge
-import math
+from tsp_instance import ArrayInstance
+from tsp_tour import ArrayTour, TrackedTour
+from tsp_spatial import SpatialIndex
+import numpy as np
+
+CHECK_LENGTHS = False # debug: recompute tracked tour lengths from scratch to catch a wrong delta.
 
 def distance(instance: Instance, a: int, b: int) -> int:
-    """instance is a dict of point IDs to x, y coordinates.
+    """instance is a dict of point IDs to x, y coordinates, or an ArrayInstance.
     a and b are the point IDs of the points we want to calculate the distance between.
     Returns distance as rounded int, as per TSPLIB standard.
     """
+    if isinstance(instance, ArrayInstance):
+        dx = instance.x[b] - instance.x[a]
+        dy = instance.y[b] - instance.y[a]
+        return int(round((dx ** 2 + dy ** 2) ** 0.5))
     ax = instance[a][0]
     ay = instance[a][1]
     bx = instance[b][0]
@@ -17,12 +26,67 @@ def distance(instance: Instance, a: int, b: int) -> int:
     dy = by - ay
     return int(round((dx ** 2 + dy ** 2) ** 0.5))
 
+def distance_function(instance: Instance) -> Callable[[int, int], int]:
+    """Returns distance(a, b) bound to instance, with the coordinate containers looked up once.
+    Same result as distance(), but cheaper per call; meant for hot loops.
+    """
+    if isinstance(instance, ArrayInstance):
+        x = instance.x
+        y = instance.y
+        def array_distance(a: int, b: int) -> int:
+            dx = x[b] - x[a]
+            dy = y[b] - y[a]
+            return int(round((dx * dx + dy * dy) ** 0.5))
+        return array_distance
+    def dict_distance(a: int, b: int) -> int:
+        ax, ay = instance[a]
+        bx, by = instance[b]
+        dx = bx - ax
+        dy = by - ay
+        return int(round((dx * dx + dy * dy) ** 0.5))
+    return dict_distance
+
+def _coordinate_arrays(instance: Instance, point_ids) -> Tuple[np.ndarray, np.ndarray]:
+    """Returns x and y coordinates for a point ID or an array of point IDs. """
+    if isinstance(instance, ArrayInstance):
+        return np.frombuffer(instance.x)[point_ids], np.frombuffer(instance.y)[point_ids]
+    if np.ndim(point_ids) == 0:
+        return instance[int(point_ids)]
+    coordinates = np.array([instance[p] for p in point_ids.tolist()], dtype=np.float64).reshape(-1, 2)
+    return coordinates[:, 0], coordinates[:, 1]
+
+def distances(instance: Instance, a, b) -> np.ndarray:
+    """Vectorized distance(). a and b are point IDs or equal-length arrays of point IDs (a single ID is broadcast).
+    Returns an int64 array of the rounded distances between a[i] and b[i], as per TSPLIB standard.
+    """
+    ax, ay = _coordinate_arrays(instance=instance, point_ids=np.asarray(a, dtype=np.int64))
+    bx, by = _coordinate_arrays(instance=instance, point_ids=np.asarray(b, dtype=np.int64))
+    dx = bx - ax
+    dy = by - ay
+    return np.rint(np.sqrt(dx * dx + dy * dy)).astype(np.int64)
+
+def _tour_array(tour: Tour) -> np.ndarray:
+    if isinstance(tour, TrackedTour):
+        return np.asarray(tour.points if isinstance(tour, ArrayTour) else tour.to_list(), dtype=np.int64)
+    return np.asarray(tour, dtype=np.int64)
+
+def _measure_length(instance: Instance, tour: Tour) -> int:
+    points = _tour_array(tour)
+    return int(distances(instance=instance, a=points, b=np.roll(points, 1)).sum())
+
 def tour_length(instance: Instance, tour: Tour) -> int:
-    total = 0
-    prev = tour[-1]
-    for point_id in tour:
-        total += distance(instance=instance, a=point_id, b=prev)
-        prev = point_id
+    """Returns the length of tour. An ArrayTour or TwoLevelTour is measured once, then its length is tracked through every change
+    (see TrackedTour.track_length). With CHECK_LENGTHS, a tracked length is checked against a full measurement.
+    """
+    if isinstance(tour, TrackedTour):
+        total = tour.tracked_length(source=instance)
+        if total is None:
+            total = _measure_length(instance=instance, tour=tour)
+            tour.track_length(source=instance, distance=distance_function(instance=instance), length=total)
+        elif CHECK_LENGTHS:
+            assert(total == _measure_length(instance=instance, tour=tour))
+    else:
+        total = _measure_length(instance=instance, tour=tour)
     return total
 
 def get_edges_from_tour(tour: Tour) -> Tuple[Edge]:
@@ -33,34 +97,37 @@ def get_edges_from_tour(tour: Tour) -> Tuple[Edge]:
         prev = point_id
     return edges
 
-def min_cost_insertion(instance: Instance, tour: Tour, new_point_id: int) -> Tour:
-    edges = get_edges_from_tour(tour=tour)
+def min_cost_insertion(instance: Instance, tour: Tour, new_point_id: int, spatial_index: Optional[SpatialIndex] = None) -> Tour:
+    """Inserts new_point_id into the tour edge where it adds the least length.
+    With spatial_index (and an ArrayTour), only the edges next to the tour points nearest to new_point_id are tried.
+    """
     p = new_point_id
-    min_cost = math.inf
-    min_replacement = None
-    for edge in edges:
-        a, b = edge
-        ab = distance(instance=instance, a=a, b=b)
-        pa = distance(instance=instance, a=p, b=a)
-        pb = distance(instance=instance, a=p, b=b)
-        diff = pa + pb - ab
-        if diff == min_cost:
-            min_replacement.append(edge)
-        elif diff < min_cost:
-            min_cost = diff
-            min_replacement = [edge]
-    old_edge = min_replacement[0] # TODO: have multiple methods for choosing among candidates.
-    a, b = old_edge
-    i = tour.index(a)
-    j = tour.index(b)
-    diff = abs(i - j)
-    if diff == 1:
-        return tour[:max(i, j)] + [p] + tour[max(i, j):]
+    if spatial_index is not None:
+        assert(isinstance(tour, ArrayTour))
+        edges = np.array(spatial_index.nearest_tour_edges(*instance[p], tour=tour), dtype=np.int64)
+        prev_points = edges[:, 0]
+        points = edges[:, 1]
     else:
-        assert(min(i, j) == 0)
+        # edge k is (tour[k - 1], tour[k]), as ordered by get_edges_from_tour.
+        points = _tour_array(tour)
+        prev_points = np.roll(points, 1)
+    pa = distances(instance=instance, a=p, b=prev_points)
+    pb = distances(instance=instance, a=p, b=points)
+    ab = distances(instance=instance, a=prev_points, b=points)
+    diff = pa + pb - ab
+    min_replacement = np.flatnonzero(diff == diff.min())
+    k = int(min_replacement[0]) # TODO: have multiple methods for choosing among candidates.
+    if spatial_index is not None:
+        k = tour.index(int(points[k]))
+    if isinstance(tour, ArrayTour):
+        # inserted in place; edge 0 closes the tour, so it is split by appending.
+        tour.insert(k if k > 0 else len(tour), p)
+        return tour
+    if k == 0:
         return tour + [p]
+    return tour[:k] + [p] + tour[k:]
 
-def add_midpoint_to_instance(instance: Instance, edge: Edge):
+def add_midpoint_to_instance(instance: Instance, edge: Edge, spatial_index: Optional[SpatialIndex] = None):
     a, b = edge
     ax = instance[a][0]
     ay = instance[a][1]
@@ -70,10 +137,12 @@ def add_midpoint_to_instance(instance: Instance, edge: Edge):
     dy = by - ay
     new_id = max(instance.keys()) + 1
     instance[new_id] = (ax + dx / 2, ay + dy / 2)
+    if spatial_index is not None:
+        spatial_index.insert(new_id)
     return new_id
 
-def add_midpoints_to_instance(instance: Instance, edges: List[Edge]):
+def add_midpoints_to_instance(instance: Instance, edges: List[Edge], spatial_index: Optional[SpatialIndex] = None):
     new_point_ids = []
     for edge in edges:
-        new_point_ids.append(add_midpoint_to_instance(instance=instance, edge=edge))
+        new_point_ids.append(add_midpoint_to_instance(instance=instance, edge=edge, spatial_index=spatial_index))
     return new_point_ids
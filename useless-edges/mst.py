@@ -1,71 +1,129 @@
 #!/usr/bin/env python3
 
-# Kruskal's algorithm. Aiming for implementation simplicity, rather than efficiency.
+# Euclidean MST: Kruskal's algorithm over the Delaunay triangulation, or Prim's algorithm on a spatial index.
 
-from typing import Optional, Dict, Tuple, List
+import heapq
+from typing import Optional, Dict, Tuple, List, Set
 
 from tsp_reader import read_instance
 from tsp_math import distance
+from tsp_spatial import SpatialIndex
+from union_find import UnionFind
+
+try:
+    from scipy.spatial import Delaunay
+except ImportError:
+    Delaunay = None # the MST falls back to Prim's algorithm on a spatial index.
+METHOD = "prim" if Delaunay is None else "delaunay" # how mst computes the tree here, for cache keys (see tsp_cache).
 
 Instance = Dict[int, Tuple[float, float]] # point ID to coordinates
 Edge = Tuple[int, int, int] # distance, min point ID, max point ID
 
 def make_edge(instance: Instance, a: int, b: int) -> Edge:
-    n = len(instance)
     return (distance(instance=instance, a=a, b=b), min(a, b), max(a, b))
 
-def make_sorted_edges(instance: Instance) -> List[Edge]:
-    """ returns all possible edges sorted by cost. complexity is at least O(n**2 * log(n**2))
+def _delaunay_pairs(instance: Instance) -> Optional[Set[Tuple[int, int]]]:
+    """Returns the Delaunay triangulation edges, or None if scipy is unavailable or the points are degenerate.
+    Coincident points are triangulated once, and each duplicate is joined to the triangulated point by a zero-cost edge.
     """
-    edges = []
-    n = len(instance)
-    all_ids = list(instance.keys())
-    for i in range(n):
-        a = all_ids[i]
-        for j in range(i + 1, n):
-            b = all_ids[j]
-            edges.append(make_edge(instance, a=a, b=b))
+    if Delaunay is None:
+        return None
+    first = {} # coordinates to the first point ID there.
+    pairs = set()
+    for p, c in instance.items():
+        q = first.setdefault(c, p)
+        if q != p:
+            pairs.add((min(p, q), max(p, q)))
+    ids = list(first.values())
+    if len(ids) < 3:
+        return None
+    try:
+        triangulation = Delaunay([instance[p] for p in ids])
+    except Exception: # scipy raises QhullError for collinear inputs.
+        return None
+    if len(triangulation.coplanar) > 0:
+        return None # nearly coincident points left out of the triangulation.
+    for simplex in triangulation.simplices:
+        for i in range(3):
+            a = ids[simplex[i]]
+            b = ids[simplex[(i + 1) % 3]]
+            pairs.add((min(a, b), max(a, b)))
+    return pairs
+
+def make_sorted_edges(instance: Instance) -> Optional[List[Edge]]:
+    """Returns the Delaunay triangulation edges, which contain a Euclidean MST, sorted by cost:
+    O(n) edges instead of all n**2 pairs. Returns None if there is no triangulation (see _delaunay_pairs).
+    """
+    pairs = _delaunay_pairs(instance)
+    if pairs is None:
+        return None
+    edges = [make_edge(instance, a=a, b=b) for a, b in pairs]
     edges.sort()
     return edges
 
-def mst(instance: Instance) -> List[Edge]:
-    """Returns MST for given instance.
+def _nearest_edge(instance: Instance, spatial_index: SpatialIndex, a: int, radius: float) -> Optional[Edge]:
+    """Returns the least edge (by cost, then point IDs) from a to an indexed point within radius, or None. Any point
+    outside radius is farther than all points inside it, so a found edge is the least to any indexed point.
     """
-    sorted_edges = make_sorted_edges(instance)
-    sets = []
+    x, y = instance[a]
+    points = spatial_index.within(x, y, radius)
+    if not points:
+        return None
+    return min(make_edge(instance, a=a, b=b) for b in points)
+
+def _prim(instance: Instance) -> List[Edge]:
+    """Prim's algorithm on the complete graph. Points leave a spatial index as they join the tree, so queries only see
+    points outside it. Each tree point has its least edge out in a heap, or, if none is within its search radius, a
+    lower bound on that edge's cost; the radius doubles each time such a bound comes up. An edge whose far end has
+    since joined the tree is replaced by a new query when it comes up.
+    """
+    spatial_index = SpatialIndex(instance=instance)
+    start = next(iter(instance))
+    spatial_index.remove(start)
+    in_tree = {start}
+    heap = []
+    def push(a: int, radius: float):
+        if len(spatial_index) == 0:
+            return
+        e = _nearest_edge(instance=instance, spatial_index=spatial_index, a=a, radius=radius)
+        if e is None:
+            # rounding is monotone, so every edge out of a costs at least int(radius).
+            e = (int(radius), -1, -1)
+        heapq.heappush(heap, (e, a, radius))
+    push(start, spatial_index.size)
     edges = []
-    for e in sorted_edges:
-        # determine which edge sets this new edge belongs to.
-        found = []
-        cyclic = False
-        a = e[1]
-        b = e[2]
-        for i in range(len(sets)):
-            if a in sets[i] and b in sets[i]:
-                cyclic = True
-                break
-            elif a in sets[i] or b in sets[i]:
-                found.append(i)
-        if cyclic:
+    while heap:
+        e, a, radius = heapq.heappop(heap)
+        if e[1] < 0:
+            push(a, 2 * radius)
             continue
-        assert(len(found) <= 2)
-
-        # create new set, add to existing, or merge 2 existing.
-        if len(found) == 0:
-            sets.append(set())
-            sets[-1].add(a)
-            sets[-1].add(b)
-        elif len(found) == 1:
-            sets[found[0]].add(a)
-            sets[found[0]].add(b)
-        elif len(found) == 2:
-            sets[found[0]].update(sets[found[1]])
-            sets.pop(found[1])
-        edges.append(e)
-
-        # end if all points included.
-        if len(edges) == len(instance):
-            break
+        b = e[2] if e[1] == a else e[1]
+        if b not in in_tree:
+            edges.append(e)
+            in_tree.add(b)
+            spatial_index.remove(b)
+            push(b, spatial_index.size)
+        push(a, radius)
+    return edges
+
+def mst(instance: Instance) -> List[Tuple[int, int]]:
+    """Returns MST for given instance.
+    With a Delaunay triangulation (scipy), Kruskal's algorithm over its edges (make_sorted_edges), tracking components
+    with a union-find. Without one, Prim's algorithm with exact radius queries on a spatial index (_prim).
+    Either way the tree is exact.
+    """
+    sorted_edges = make_sorted_edges(instance)
+    if sorted_edges is None:
+        edges = _prim(instance=instance)
+    else:
+        components = UnionFind(max(instance.keys()) + 1)
+        edges = []
+        for e in sorted_edges:
+            if components.union(e[1], e[2]):
+                edges.append(e)
+                # end if all points connected.
+                if len(edges) == len(instance) - 1:
+                    break
 
     # check that result touches all points.
     check = set()
@@ -91,10 +149,9 @@ def get_degree_to_points(edges: List[Edge]):
         degree_to_points[deg].append(point_id)
     return degree_to_points
 
-import sys
-import tsp_plot
-
 if __name__ == "__main__":
+    import sys
+    import tsp_plot # plotting only.
     instance_file = sys.argv[1]
     instance = read_instance(instance_file)
     edges = mst(instance=instance)
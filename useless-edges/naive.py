@@ -6,6 +6,7 @@
 from typing import Optional, Dict, Tuple, List
 from tsp_reader import read_instance, read_tour
 from tsp_math import distance
+import tsp_cache
 
 Instance = Dict[int, Tuple[float, float]] # point ID to coordinates
 Edge = Tuple[int, int] # point ID, point ID
@@ -84,7 +85,8 @@ if __name__ == "__main__":
         total_edge_count = get_total_edge_count(instance=instance)
         print(f"Total edge count: {total_edge_count}")
         print(f"Average edge length {get_average_edge_length(instance)}")
-        non_useless_edges, useless_edges = get_non_useless_edges(instance)
+        non_useless_edges, useless_edges = tsp_cache.load_or_compute(instance_path, "useless_edges",
+            lambda: get_non_useless_edges(instance), method="naive")
         print(f"Non useless edge count: {len(non_useless_edges)}")
         print(f"Non useless edge average length: {get_average_edge_length(instance, non_useless_edges)}")
 
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+
+# Classifies useless edges (see proximal.py) with a process pool.
+# Every row of edges (a, b), b after a, is classified independently, so rows are handed out to workers one at a time.
+# Workers read the instance from a shared memory block instead of receiving a pickled copy,
+# and every finished row is appended to a row file as soon as it arrives, so an interrupted run resumes where it stopped.
+
+import os
+from array import array
+from multiprocessing import Pool, shared_memory
+from typing import Optional, Dict, Tuple, List
+from tsp_reader import read_instance
+from tsp_instance import ArrayInstance, from_dict
+from proximal import ProximalFilter, get_total_edge_count
+import tsp_cache
+
+Instance = Dict[int, Tuple[float, float]] # point ID to coordinates
+Edge = Tuple[int, int] # point ID, point ID
+
+ROWS_NAME = "useless_edges.rows"
+
+def rows_path(instance_path: str) -> str:
+    """Default row file of the instance file at instance_path, in its cache directory. """
+    return os.path.join(instance_path + tsp_cache.DIRECTORY_SUFFIX, ROWS_NAME)
+
+def _share(instance: ArrayInstance) -> shared_memory.SharedMemory:
+    """Copies the ids, x and y arrays of instance into a new shared memory block. """
+    arrays = [array("q", instance.ids), array("d", instance.x), array("d", instance.y)]
+    block = shared_memory.SharedMemory(create=True, size=max(1, sum(len(a) * a.itemsize for a in arrays)))
+    start = 0
+    for a in arrays:
+        data = memoryview(a).cast("B")
+        block.buf[start:start + len(data)] = data
+        start += len(data)
+    return block
+
+def _attach(name: str, count: int, size: int) -> Tuple[shared_memory.SharedMemory, ArrayInstance]:
+    """Returns the shared memory block called name and an ArrayInstance whose arrays are views of it. """
+    block = shared_memory.SharedMemory(name=name)
+    view = block.buf
+    instance = ArrayInstance()
+    instance.ids = view[:8 * count].cast("q")
+    instance.x = view[8 * count:8 * (count + size)].cast("d")
+    instance.y = view[8 * (count + size):8 * (count + 2 * size)].cast("d")
+    return block, instance
+
+_worker = {} # per worker process: shared memory block and the filter built from it.
+
+def _initialize(name: str, count: int, size: int):
+    block, instance = _attach(name=name, count=count, size=size)
+    _worker["block"] = block
+    _worker["filter"] = ProximalFilter(instance=instance)
+
+def _classify_row(i: int) -> Tuple[int, str]:
+    """Returns row i as a string with a "1" for every useless edge (ids[i], ids[j]), j > i, and "0" otherwise. """
+    return i, "".join(["1" if useless else "0" for useless in _worker["filter"].useless_edges_from(i)])
+
+def _read_rows(path: str, key: str, n: int) -> Dict[int, str]:
+    """Returns the complete rows of the row file at path, if it was written for the instance with the given key. """
+    rows = {}
+    try:
+        with open(path, "r") as f:
+            if f.readline().strip() != key:
+                return rows
+            for line in f:
+                fields = line.split()
+                if len(fields) != 2 or not fields[0].isdigit():
+                    continue
+                i = int(fields[0])
+                # the last line may be cut short by an interrupted write.
+                if i < n and len(fields[1]) == n - i - 1 and line.endswith("\n"):
+                    rows[i] = fields[1]
+    except OSError:
+        pass
+    return rows
+
+def get_non_useless_edges(instance: Instance, instance_path: str, path: Optional[str] = None,
+        processes: Optional[int] = None) -> Tuple[List[Edge], List[Edge]]:
+    """Returns the non-useless and useless edges, in the same order as naive.get_non_useless_edges.
+    Rows already in the row file at path (default: rows_path(instance_path)) are not classified again.
+    """
+    if not isinstance(instance, ArrayInstance):
+        instance = from_dict(instance)
+    ids = list(instance.keys())
+    n = len(ids)
+    path = path if path is not None else rows_path(instance_path)
+    key = f"{tsp_cache.content_hash(instance_path)} {n}"
+    rows = _read_rows(path=path, key=key, n=n)
+    remaining = [i for i in range(n) if i not in rows]
+    if rows:
+        print(f"Resuming with {len(rows)} of {n} rows done.")
+    if remaining:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        if not rows:
+            with open(path, "w") as f:
+                f.write(key + "\n")
+        block = _share(instance)
+        try:
+            with open(path, "a") as f, Pool(processes=processes, initializer=_initialize,
+                    initargs=(block.name, len(instance.ids), len(instance.x))) as pool:
+                # longest rows first, so the pool does not end waiting on one long row.
+                for i, row in pool.imap_unordered(_classify_row, remaining):
+                    f.write(f"{i} {row}\n")
+                    f.flush()
+                    rows[i] = row
+                    print(f"{len(rows)} / {n} rows")
+        finally:
+            block.close()
+            block.unlink()
+    non_useless_edges = []
+    useless_edges = []
+    for i in range(n):
+        for j, useless in enumerate(rows[i], i + 1):
+            if useless == "1":
+                useless_edges.append((ids[i], ids[j]))
+            else:
+                non_useless_edges.append((ids[i], ids[j]))
+    return non_useless_edges, useless_edges
+
+import sys
+
+if __name__ == "__main__":
+    # Read instance file.
+    if len(sys.argv) > 1:
+        instance_path = sys.argv[1]
+        processes = int(sys.argv[2]) if len(sys.argv) > 2 else None
+        print(f"Reading instance file at path: {instance_path}")
+        instance = read_instance(path=instance_path)
+        print(f"Read {len(instance)} points in instance.")
+        total_edge_count = get_total_edge_count(instance=instance)
+        print(f"Total edge count: {total_edge_count}")
+        non_useless_edges, useless_edges = tsp_cache.load_or_compute(instance_path, "useless_edges",
+            lambda: get_non_useless_edges(instance, instance_path=instance_path, processes=processes), method="proximal")
+        print(f"Non useless edge count: {len(non_useless_edges)}")
@@ -1,75 +1,122 @@
 #!/usr/bin/env python3
 
-# Calculates 'useless edges' using a naively-implemented, but theoretically efficient algorithm.
-# A 'useless edge' is an edge that is not a part of any improving 2-opt move.
+# Calculates 'useless edges' with the same definition as naive.py, but prunes the witness search spatially.
+# A 'useless edge' is an edge that is not part of any improving or neutral 2-opt move.
+#
+# Edge (a, b) is useless if some point c (a 'witness') has ab + cd >= ac + bd and ab + cd >= ad + bc for every other d.
+# Taking d as the nearest point to c other than a and b, and the (rounded) triangle inequality bd >= bc - cd - 1,
+# a witness must satisfy ac + bc <= ab + 2 * cd + 1: it lies in a thin ellipse around the edge, within
+# ab + 2 * cd + 1 of a. So only points near a (a prefix of the points sorted by distance to a) are candidates.
+# Candidates inside the ellipse are first checked against their own nearest points as d (the likeliest to make a move),
+# and only the survivors get the full check against every d, vectorized with numpy.
 
 from typing import Dict, Tuple, List
+import numpy as np
 from tsp_reader import read_instance
-from tsp_math import distance
+from tsp_spatial import SpatialIndex
+import tsp_cache
 
-def get_nearby_points(instance: Dict[int, Tuple[float, float]], center: int, radius: int) -> List[int]:
-    nearby_points = []
-    for p in instance:
-        if p == center:
-            continue
-        if distance(instance=instance, a=center, b=p) <= radius:
-            nearby_points.append(p)
-    return nearby_points
+Instance = Dict[int, Tuple[float, float]] # point ID to coordinates
+Edge = Tuple[int, int] # point ID, point ID
 
-def is_useless_edge(instance: Dict[int, Tuple[float, float]], a: int, b: int) -> bool:
-    """Returns True if the input edge specified by 2 endpoint IDs (a, b) is useless. """
-    all_indices = list(instance.keys())
-    ab = distance(instance=instance, a=a, b=b)
-    a_nearby = get_nearby_points(instance=instance, center=a, radius=ab)
-    for c in a_nearby:
-        if c == b:
-            continue
-        ac = distance(instance=instance, a=a, b=c)
-        c_nearby = get_nearby_points(instance=instance, center=c, radius=ab - ac)
-        for e in c_nearby:
-            ce = distance(instance=instance, a=c, b=e)
+WITNESS_SLACK = 2 # >= 1 needed by the rounded triangle inequality; 1 more against floating point error.
+NEIGHBOR_COUNT = 8 # nearest points of c checked as d before the full check.
 
+class ProximalFilter:
+    """Classifies edges of an instance as useless or not.
+    Points are addressed by their index in ids; per-point arrays (coordinates, nearest neighbors) are indexed the same way.
+    """
 
-    # TODO: under construction!
+    def __init__(self, instance: Instance):
+        self.ids = list(instance.keys())
+        n = len(self.ids)
+        coordinates = np.array([instance[p] for p in self.ids], dtype=np.float64).reshape(-1, 2)
+        self.x = coordinates[:, 0]
+        self.y = coordinates[:, 1]
+        # nearest points of each point (index, or -1 if there are too few points) and their distances.
+        k = min(NEIGHBOR_COUNT, n - 1)
+        self.neighbors = np.full((n, NEIGHBOR_COUNT), -1, dtype=np.int64)
+        self.neighbor_distances = np.full((n, NEIGHBOR_COUNT), np.iinfo(np.int64).max // 4, dtype=np.int64)
+        if k > 0:
+            index_of = {p: i for i, p in enumerate(self.ids)}
+            spatial_index = SpatialIndex(instance=instance)
+            for i, p in enumerate(self.ids):
+                nearest = [index_of[q] for q in spatial_index.k_nearest(point_id=p, k=k)]
+                self.neighbors[i, :k] = nearest
+                self.neighbor_distances[i, :k] = self.distances(i, np.array(nearest, dtype=np.int64))
+        # at least one of the 3 nearest points of c is neither a nor b, so the 3rd nearest distance bounds
+        # how far from a a witness can be.
+        self.max_neighbor_distance = int(self.neighbor_distances[:, min(2, NEIGHBOR_COUNT - 1)].max())
 
+    def distances(self, i: int, points=None) -> np.ndarray:
+        """Rounded distances from point i to points (default: all points). """
+        if points is None:
+            dx = self.x - self.x[i]
+            dy = self.y - self.y[i]
+        else:
+            dx = self.x[points] - self.x[i]
+            dy = self.y[points] - self.y[i]
+        return np.rint(np.sqrt(dx * dx + dy * dy)).astype(np.int64)
 
-    for c in all_indices:
-        if c in (a, b):
-            continue
-        c_useless = True
-        for d in all_indices:
-            if d in (a, b, c):
-                continue
-            cd = distance(instance=instance, a=c, b=d)
-            ac = distance(instance=instance, a=a, b=c)
-            bd = distance(instance=instance, a=b, b=d)
-            if ab + cd < ac + bd:
-                c_useless = False
-                break
-            ad = distance(instance=instance, a=a, b=d)
-            bc = distance(instance=instance, a=b, b=c)
-            if ab + cd < ad + bc:
-                c_useless = False
-                break
-        if c_useless:
-            return True
-    return False
+    def is_witness(self, a: int, b: int, c: int, ab: int, ad: np.ndarray, bd: np.ndarray) -> bool:
+        """Returns True if no d makes an improving or neutral 2-opt move with edge (a, b) and an edge (c, d). """
+        cd = self.distances(c)
+        ac = ad[c]
+        bc = bd[c]
+        violations = (ab + cd < ac + bd) | (ab + cd < ad + bc)
+        violations[[a, b, c]] = False
+        return not violations.any()
 
-def get_non_useless_edges(instance: Dict[int, Tuple[float, float]]) -> List[Tuple[int, int]]:
-    all_indices = list(instance.keys())
-    n = len(all_indices)
+    def useless_edges_from(self, a: int) -> List[bool]:
+        """Returns, for every point index b > a, whether edge (a, b) is useless. """
+        n = len(self.ids)
+        ad = self.distances(a)
+        by_distance = np.argsort(ad, kind="stable")
+        sorted_distances = ad[by_distance]
+        useless = []
+        for b in range(a + 1, n):
+            ab = int(ad[b])
+            # witnesses are within ab + 2 * cd + slack of a.
+            limit = ab + 2 * self.max_neighbor_distance + WITNESS_SLACK
+            candidates = by_distance[:np.searchsorted(sorted_distances, limit, side="right")]
+            candidates = candidates[(candidates != a) & (candidates != b)]
+            bd = self.distances(b)
+            # distance from each candidate to its nearest point other than a and b.
+            neighbors = self.neighbors[candidates]
+            other = (neighbors != a) & (neighbors != b)
+            nearest = self.neighbor_distances[candidates, other.argmax(axis=1)]
+            slack = ad[candidates] + bd[candidates] - ab
+            inside = slack <= 2 * nearest + WITNESS_SLACK
+            candidates = candidates[inside]
+            slack = slack[inside]
+            # drop candidates for which one of their nearest points makes a move.
+            neighbors = neighbors[inside]
+            other = other[inside] & (neighbors >= 0)
+            cd = self.neighbor_distances[candidates]
+            ac = ad[candidates, None]
+            bc = bd[candidates, None]
+            moves = (ab + cd < ac + bd[neighbors]) | (ab + cd < ad[neighbors] + bc)
+            survivors = ~(moves & other).any(axis=1)
+            witnesses = candidates[survivors][np.argsort(slack[survivors], kind="stable")]
+            useless.append(any(self.is_witness(a, b, int(c), ab, ad, bd) for c in witnesses))
+        return useless
+
+def get_non_useless_edges(instance: Instance) -> Tuple[List[Edge], List[Edge]]:
+    """Returns the non-useless and useless edges, in the same order as naive.get_non_useless_edges. """
+    proximal_filter = ProximalFilter(instance=instance)
+    ids = proximal_filter.ids
     non_useless_edges = []
-    for i in range(n):
+    useless_edges = []
+    for i in range(len(ids)):
         print(i)
-        a = all_indices[i]
-        for j in range(i + 1, n):
-            b = all_indices[j]
-            if is_useless_edge(instance=instance, a=a, b=b):
-                continue
-            non_useless_edges.append((a, b))
-    return non_useless_edges
+        for j, useless in enumerate(proximal_filter.useless_edges_from(i), i + 1):
+            if useless:
+                useless_edges.append((ids[i], ids[j]))
+            else:
+                non_useless_edges.append((ids[i], ids[j]))
+    return non_useless_edges, useless_edges
 
-def get_total_edge_count(instance: Dict[int, Tuple[float, float]]) -> int:
+def get_total_edge_count(instance: Instance) -> int:
     n = len(instance)
     return int(n * (n - 1) / 2)
 
@@ -84,6 +131,6 @@ if __name__ == "__main__":
         print(f"Read {len(instance)} points in instance.")
         total_edge_count = get_total_edge_count(instance=instance)
         print(f"Total edge count: {total_edge_count}")
-        non_useless_edges = get_non_useless_edges(instance)
+        non_useless_edges, useless_edges = tsp_cache.load_or_compute(instance_path, "useless_edges",
+            lambda: get_non_useless_edges(instance), method="proximal")
         print(f"Non useless edge count: {len(non_useless_edges)}")
-
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+
+# Compact, array-backed alternative to the dict-of-tuples Instance.
+
+from array import array
+from typing import Dict, Tuple, List, Iterator
+
+Coordinates = Tuple[float, float]
+
+ABSENT = float("nan") # coordinate value of unused point ID slots.
+
+class ArrayInstance:
+    """Point coordinates stored in contiguous x and y arrays indexed directly by point ID.
+    TSPLIB point IDs are dense (1 to n), so the point ID doubles as the array index and coordinate lookups are
+    two array reads with no hashing. Unused ID slots hold NaN.
+    Supports the dict operations the solvers use on an Instance (len, iteration over IDs, keys, values, items, [], copy),
+    so it can be passed anywhere a dict instance is accepted.
+    The arrays may also be memoryviews of a memory-mapped cache (see tsp_cache); they are copied into arrays
+    the first time a point is added.
+    """
+
+    def __init__(self):
+        self.ids = array("q") # point IDs, in insertion order.
+        self.x = array("d") # point ID -> x coordinate.
+        self.y = array("d") # point ID -> y coordinate.
+        self.header = {} # TSPLIB specification part (NAME, DIMENSION, ...), if read from a file.
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.ids)
+
+    def __contains__(self, point_id: int) -> bool:
+        return 0 <= point_id < len(self.x) and self.x[point_id] == self.x[point_id]
+
+    def __getitem__(self, point_id: int) -> Coordinates:
+        if point_id not in self:
+            raise KeyError(point_id)
+        return (self.x[point_id], self.y[point_id])
+
+    def __setitem__(self, point_id: int, coordinates: Coordinates):
+        assert(point_id >= 0)
+        if point_id not in self:
+            if not isinstance(self.ids, array):
+                self.ids = array("q", self.ids)
+                self.x = array("d", self.x)
+                self.y = array("d", self.y)
+            if point_id >= len(self.x):
+                padding = [ABSENT] * (point_id + 1 - len(self.x))
+                self.x.extend(padding)
+                self.y.extend(padding)
+            self.ids.append(point_id)
+        self.x[point_id] = coordinates[0]
+        self.y[point_id] = coordinates[1]
+
+    def keys(self) -> List[int]:
+        return self.ids.tolist()
+
+    def values(self) -> List[Coordinates]:
+        return [(self.x[p], self.y[p]) for p in self.ids]
+
+    def items(self) -> List[Tuple[int, Coordinates]]:
+        return [(p, (self.x[p], self.y[p])) for p in self.ids]
+
+    def __getstate__(self) -> dict:
+        # memoryviews of a cache file cannot be pickled (e.g. to send the instance to worker processes).
+        state = dict(self.__dict__)
+        state["ids"] = array("q", self.ids)
+        state["x"] = array("d", self.x)
+        state["y"] = array("d", self.y)
+        return state
+
+    def copy(self) -> "ArrayInstance":
+        instance = ArrayInstance()
+        instance.ids = array("q", self.ids)
+        instance.x = array("d", self.x)
+        instance.y = array("d", self.y)
+        instance.header = dict(self.header)
+        return instance
+
+def from_dict(instance: Dict[int, Coordinates]) -> ArrayInstance:
+    """Converts a dict of point ID to coordinates into an ArrayInstance, preserving point order. """
+    array_instance = ArrayInstance()
+    for point_id, coordinates in instance.items():
+        array_instance[point_id] = coordinates
+    return array_instance